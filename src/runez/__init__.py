@@ -17,35 +17,49 @@ DRYRUN mode:
     It's recommended to set DRYRUN only once at the start of your run via: runez.log.setup(dryrun=...)
 """
 
-from runez import click, config, heartbeat, program, serialize
+from runez import click, config, graph, heartbeat, program, serialize
+from runez.background import BackgroundProcess, run_background
 from runez.base import decode, Slotted, Undefined, UNSET
 from runez.config import capped, from_json, to_boolean, to_bytesize, to_dict, to_int, to_number
 from runez.context import CaptureOutput, CurrentFolder, TempFolder, TrackedOutput, verify_abort
 from runez.convert import Anchored, flattened, formatted, quoted, represented_args, resolved_path, short, shortened
 from runez.convert import SANITIZED, SHELL, UNIQUE
-from runez.file import copy, delete, first_line, get_conf, get_lines, move, symlink, touch, write
+from runez.coprocess import Coprocess
+from runez.file import copy, delete, first_line, get_conf, get_lines, move, symlink, sync, touch, write
 from runez.heartbeat import Heartbeat
+from runez.hooks import RunHooks, RunStats
 from runez.logsetup import LogManager as log, LogSpec
 from runez.path import basename, ensure_folder, parent_folder
-from runez.program import check_pid, get_dev_folder, get_program_path, is_executable, is_younger, make_executable, run, which
+from runez.pool import run_many, RunPool
+from runez.processes import ProcessTable
+from runez.program import check_pid, EnvProfile, get_dev_folder, get_program_path, is_executable, is_younger, iter_run, make_executable
+from runez.program import RetryPolicy, run, run_pipeline, RunResult, RunUsage, which
 from runez.represent import header
+from runez.runcache import RunCache
 from runez.serialize import read_json, save_json, Serializable
 from runez.system import abort, get_caller_name, get_timezone, get_version, set_dryrun
 
 __all__ = [
     "DRYRUN",
-    "click", "config", "heartbeat", "logsetup", "program", "serialize",
+    "click", "config", "graph", "heartbeat", "logsetup", "program", "serialize",
+    "BackgroundProcess", "run_background",
     "decode", "Slotted", "Undefined", "UNSET",
     "capped", "from_json", "to_boolean", "to_bytesize", "to_dict", "to_int", "to_number",
     "CaptureOutput", "CurrentFolder", "TempFolder", "TrackedOutput", "verify_abort",
     "Anchored", "flattened", "formatted", "quoted", "represented_args", "resolved_path", "short", "shortened",
     "SANITIZED", "SHELL", "UNIQUE",
-    "copy", "delete", "first_line", "get_conf", "get_lines", "move", "symlink", "touch", "write",
+    "Coprocess",
+    "copy", "delete", "first_line", "get_conf", "get_lines", "move", "symlink", "sync", "touch", "write",
     "Heartbeat",
+    "RunHooks", "RunStats",
     "log", "LogSpec",
     "basename", "ensure_folder", "parent_folder",
-    "check_pid", "get_dev_folder", "get_program_path", "is_executable", "is_younger", "make_executable", "run", "which",
+    "run_many", "RunPool",
+    "ProcessTable",
+    "check_pid", "EnvProfile", "get_dev_folder", "get_program_path", "is_executable", "is_younger", "iter_run", "make_executable",
+    "RetryPolicy", "run", "run_pipeline", "RunResult", "RunUsage", "which",
     "header",
+    "RunCache",
     "read_json", "save_json", "Serializable",
     "abort", "get_caller_name", "get_timezone", "get_version", "set_dryrun",
 ]
@@ -0,0 +1,178 @@
+"""
+Programs started in the background, detached from current process
+
+Usage:
+    from runez.background import run_background
+
+    daemon = run_background("some-daemon", pidfile=".daemon.pid")
+    ...
+    daemon.stop()
+"""
+
+import logging
+import os
+import signal
+import subprocess  # nosec
+import sys
+import time
+
+from runez.convert import short
+from runez.file import delete, first_line, write
+from runez.program import _close_redirects, _fatal, _popen, _run_prelude, check_pid
+from runez.system import abort, is_dryrun
+
+
+LOG = logging.getLogger(__name__)
+
+
+def run_background(program, *args, **kwargs):
+    """
+    Start 'program' in the background, detached from current process (in its own session), without waiting for it
+
+    Accepts the same arguments as run(), plus:
+    - pidfile (str): Path to file where to record pid of started program (see BackgroundProcess.from_pidfile())
+
+    'stdin', 'stdout' and 'stderr' default to /dev/null ('stdout' and 'stderr' can be paths to log files)
+
+    :return BackgroundProcess|str|bool: Handle on started program (message in dryrun mode, abort() outcome on failure)
+    """
+    pidfile = kwargs.pop("pidfile", None)
+    kwargs.setdefault("stdout", os.devnull)
+    kwargs.setdefault("stderr", os.devnull)
+    if hasattr(subprocess, "DEVNULL"):
+        kwargs.setdefault("stdin", subprocess.DEVNULL)
+
+    if sys.version_info[0] >= 3:
+        kwargs.setdefault("start_new_session", True)
+
+    else:  # pragma: no cover, python2
+        kwargs.setdefault("preexec_fn", os.setsid)
+
+    full_path, args, options = _run_prelude(program, args, kwargs)
+    if not full_path:
+        return options["result"]
+
+    try:
+        p = _popen(full_path, args, kwargs, spawn=options["spawn"])
+
+    except Exception as e:
+        return abort("%s failed: %s", short(program), e, exc_info=e, fatal=_fatal(options))
+
+    finally:
+        _close_redirects(options)
+
+    if options["logger"]:
+        options["logger"]("Started %s in background, pid %s" % (short(full_path), p.pid))
+
+    if pidfile:
+        write(pidfile, "%s\n" % p.pid, fatal=options["fatal"])
+
+    return BackgroundProcess(p.pid, pidfile=pidfile, process=p)
+
+
+class BackgroundProcess(object):
+    """
+    Handle on a program started via run_background() (or found via its pidfile)
+
+    Usage:
+        daemon = BackgroundProcess.from_pidfile(".daemon.pid")
+        if daemon is None or not daemon.is_alive:
+            daemon = run_background("some-daemon", pidfile=".daemon.pid")
+        ...
+        daemon.stop()
+    """
+
+    def __init__(self, pid, pidfile=None, process=None):
+        """
+        :param int pid: Pid of program
+        :param str|None pidfile: Path to pidfile, if any (deleted once program is stopped)
+        :param subprocess.Popen|None process: Corresponding Popen object, when program was started by current process
+        """
+        self.pid = pid
+        self.pidfile = pidfile
+        self._process = process
+
+    def __repr__(self):
+        return "pid %s" % self.pid
+
+    @classmethod
+    def from_pidfile(cls, pidfile):
+        """
+        :param str pidfile: Path to pidfile
+        :return BackgroundProcess|None: Corresponding handle, if pidfile exists and contains a pid
+        """
+        pid = first_line(pidfile)
+        if pid and pid.isdigit():
+            return cls(int(pid), pidfile=pidfile)
+
+    @property
+    def exit_code(self):
+        """Exit code of program, if it exited (known only when program was started by current process)"""
+        return self._process and self._process.poll()
+
+    @property
+    def is_alive(self):
+        if self._process is not None:
+            return self._process.poll() is None  # Reaps program if it exited (check_pid() would see the zombie as alive)
+
+        return check_pid(self.pid)
+
+    def wait(self, timeout=None):
+        """
+        :param float|None timeout: Max time to wait, in seconds (wait indefinitely if None)
+        :return bool: True if program exited
+        """
+        deadline = timeout is not None and time.time() + timeout
+        delay = 0.001
+        while self.is_alive:
+            remaining = deadline and deadline - time.time()
+            if deadline and remaining <= 0:
+                return False
+
+            delay = min(delay * 2, 0.1)
+            time.sleep(min(delay, remaining) if deadline else delay)
+
+        return True
+
+    def stop(self, grace=5, fatal=True, logger=LOG.debug):
+        """
+        Stop program: send SIGTERM to its process group, then SIGKILL if it's still running after 'grace' seconds
+
+        :param float grace: Time to give program to exit gracefully, in seconds
+        :param bool|None fatal: Abort execution on failure if True
+        :param callable|None logger: Logger to use
+        :return int: 1 if effectively done, 0 if no-op, -1 on failure
+        """
+        if not self.is_alive:
+            delete(self.pidfile, fatal=fatal, logger=None)
+            return 0
+
+        if is_dryrun():
+            LOG.debug("Would stop %s", self)
+            return 1
+
+        if logger:
+            logger("Stopping %s" % self)
+
+        try:
+            self._signal(signal.SIGTERM)
+            if not self.wait(grace):
+                if logger:
+                    logger("%s did not exit within %ss, killing it" % (self, grace))
+
+                self._signal(signal.SIGKILL)
+                self.wait(1)
+
+        except OSError as e:
+            return abort("Can't stop %s: %s", self, e, fatal=(fatal, -1))
+
+        delete(self.pidfile, fatal=fatal, logger=None)
+        return 1
+
+    def _signal(self, sig):
+        try:
+            os.killpg(self.pid, sig)
+
+        except OSError:  # Program is not a process group leader (or exited in the meantime)
+            if self.is_alive:
+                os.kill(self.pid, sig)
@@ -0,0 +1,274 @@
+"""
+Long-running program answering requests over its stdin/stdout
+
+Usage:
+    from runez.coprocess import Coprocess
+
+    with Coprocess("git", "cat-file", "--batch-check") as git:
+        print(git.query(sha))
+"""
+
+import logging
+import os
+import subprocess  # nosec
+import tempfile
+import time
+
+from runez.base import decode
+from runez.convert import flattened, represented_args, SHELL, short
+from runez.program import _close_redirects, _fatal, _iter_chunks, _kill, _popen, _report_usage, _run_prelude, _TimedOut, _wait
+from runez.system import abort
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Coprocess(object):
+    """
+    Long-running program answering requests over its stdin/stdout, such as 'git cat-file --batch-check'
+
+    Program is started once, requests are written to its stdin, and responses are read from its stdout
+    (up to 'delimiter' by default). Program is restarted (up to 'max_restarts' times) if it dies.
+
+    Usage:
+        with Coprocess("git", "cat-file", "--batch-check") as git:
+            for sha in shas:
+                print(git.query(sha))
+    """
+
+    def __init__(self, program, *args, **kwargs):
+        """
+        :param str program: Program to run
+        :param args: Command line args
+        :param kwargs: Keyword args, same as run() ('timeout' applies to each query), plus:
+            - delimiter (bytes): Marks the end of a response (default: newline)
+            - max_restarts (int): Max number of times to restart program if it dies
+        """
+        self.program = program
+        self.delimiter = kwargs.pop("delimiter", b"\n")
+        self.max_restarts = kwargs.pop("max_restarts", 3)
+        self.restarts = 0
+        self.queries = 0
+        self.full_path = None
+        self.args = args
+        self.kwargs = kwargs
+        self.options = None
+        self.result = None  # What a query returns when program could not be started (or in dryrun mode)
+        self._p = None
+        self._started = None
+        self._stderr = None
+        self._buffer = b""
+
+    def __repr__(self):
+        return "%s %s" % (short(self.full_path or self.program), represented_args(flattened(self.args, split=SHELL)))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def is_alive(self):
+        return self._p is not None and self._p.poll() is None
+
+    @property
+    def pid(self):
+        return self._p and self._p.pid
+
+    def start(self):
+        """Start program, if not already started"""
+        if self.options is None:
+            kwargs = dict(self.kwargs, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self.full_path, self.args, self.options = _run_prelude(self.program, self.args, kwargs)
+            self.kwargs = kwargs
+            if not self.full_path:
+                self.result = self.options["result"]
+                return self
+
+        if self._p is None and self.full_path:
+            self._spawn()
+
+        return self
+
+    def stop(self):
+        """Stop program: close its stdin, and give it a chance to exit on its own before killing it"""
+        self._terminate()
+        if self.options is not None:
+            _close_redirects(self.options)
+
+    def _terminate(self, graceful=True):
+        """
+        :param bool graceful: If True, give program a chance to exit on its own (after closing its stdin) before killing it
+        """
+        p = self._p
+        if p is not None:
+            self._p = None
+            rusage = None
+            try:
+                p.stdin.close()
+
+            except (IOError, OSError):  # Program already died
+                pass
+
+            if graceful:
+                try:
+                    rusage = _wait(p, deadline=time.time() + (self.options["timeout"] or 5))
+
+                except _TimedOut:
+                    _kill(p, self.options)
+
+            else:
+                _kill(p, self.options)
+
+            p.stdout.close()
+            if p.stderr is not None:
+                p.stderr.close()
+
+            _report_usage(self.program, self.full_path, self.args, p, self._started, rusage, self.options)
+            self._close_stderr()
+
+    def query(self, request, timeout=None):
+        """
+        :param str|bytes request: Request to send (a trailing newline is added if missing)
+        :param float|None timeout: Max time to wait for response, in seconds (default: 'timeout' given to constructor)
+        :return str: Decoded response, with 'delimiter' stripped
+        """
+        if not isinstance(request, bytes):
+            request = request.encode("utf-8")
+
+        if not request.endswith(b"\n"):
+            request += b"\n"
+
+        return self.send(request, delimiter=self.delimiter, timeout=timeout)
+
+    def send(self, request, delimiter=None, size=None, timeout=None):
+        """
+        :param bytes request: Raw bytes to write to program's stdin
+        :param bytes|None delimiter: If provided, read response up to 'delimiter' (stripped from returned response)
+        :param int|None size: If provided, read exactly 'size' bytes of response
+        :param float|None timeout: Max time to wait for response, in seconds (default: 'timeout' given to constructor)
+        :return str|bytes|None: Response (decoded if 'delimiter' was provided), None if nor 'delimiter' nor 'size' are provided
+        """
+        self.start()
+        if not self.full_path:
+            return self.result
+
+        self.queries += 1
+        while True:
+            try:
+                self._p.stdin.write(request)
+                self._p.stdin.flush()
+                if delimiter is not None:
+                    return decode(self.read_until(delimiter, timeout=timeout))
+
+                if size is not None:
+                    return self.read(size, timeout=timeout)
+
+                return None
+
+            except _TimedOut:
+                return abort("%s timed out after %ss", short(self.program), timeout or self.options["timeout"], fatal=_fatal(self.options))
+
+            except (_ChildExited, IOError, OSError) as e:
+                # Program died (EPIPE on write, or EOF on read): restart it and re-send 'request'
+                failure = self._failure(e)
+                if self.restarts >= self.max_restarts:
+                    self.stop()
+                    return abort("%s died: %s", short(self.program), failure, fatal=_fatal(self.options))
+
+                self.restarts += 1
+                LOG.warning("%s died (%s), restarting it (%s/%s)", self, failure, self.restarts, self.max_restarts)
+                self._terminate()
+                self._spawn()
+
+    def read_until(self, delimiter, timeout=None):
+        """
+        :param bytes delimiter: Read output up to this delimiter
+        :param float|None timeout: Max time to wait, in seconds (default: 'timeout' given to constructor)
+        :return bytes: Output read, with 'delimiter' stripped
+        """
+        deadline = self._deadline(timeout)
+        i = self._buffer.find(delimiter)
+        while i < 0:
+            start = max(0, len(self._buffer) - len(delimiter) + 1)
+            self._fill(deadline)
+            i = self._buffer.find(delimiter, start)
+
+        result = self._buffer[:i]
+        self._buffer = self._buffer[i + len(delimiter):]
+        return result
+
+    def read(self, size, timeout=None):
+        """
+        :param int size: Number of bytes to read
+        :param float|None timeout: Max time to wait, in seconds (default: 'timeout' given to constructor)
+        :return bytes: Exactly 'size' bytes of output
+        """
+        deadline = self._deadline(timeout)
+        while len(self._buffer) < size:
+            self._fill(deadline)
+
+        result = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return result
+
+    def _deadline(self, timeout):
+        if timeout is None:
+            timeout = self.options["timeout"]
+
+        return timeout and time.time() + timeout
+
+    def _fill(self, deadline):
+        """Read next available chunk of output into buffer, kill program if it didn't respond in time"""
+        try:
+            for _, chunk in _iter_chunks([self._p.stdout], deadline=deadline):
+                self._buffer += chunk
+                return
+
+        except _TimedOut:
+            self._terminate(graceful=False)  # Program is in an unknown state, it will be restarted on next query
+            raise
+
+        raise _ChildExited()
+
+    def _spawn(self):
+        kwargs = self.kwargs
+        if kwargs.get("stderr") is None:
+            self._stderr = tempfile.TemporaryFile(prefix="runez-")
+            kwargs = dict(kwargs, stderr=self._stderr)
+
+        self._buffer = b""
+        self._started = time.time()
+        self._p = _popen(self.full_path, self.args, kwargs)
+
+    def _close_stderr(self):
+        if self._stderr is not None:
+            self._stderr.close()
+            self._stderr = None
+
+    def _failure(self, e):
+        """
+        :param Exception e: Exception that occurred when communicating with program
+        :return str: Description of what happened, with tail of stderr if available
+        """
+        try:
+            _wait(self._p, deadline=time.time() + 1)
+
+        except _TimedOut:  # pragma: no cover, program closed its stdout but is still running
+            pass
+
+        returncode = self._p.returncode
+        message = "exited with code %s" % returncode if returncode is not None else str(e) or e.__class__.__name__
+        if self._stderr is not None:
+            self._stderr.seek(0, os.SEEK_END)
+            self._stderr.seek(max(0, self._stderr.tell() - 4096))
+            err = decode(self._stderr.read(), strip=True)
+            if err:
+                message += ": %s" % err
+
+        return message
+
+
+class _ChildExited(Exception):
+    """Raised when a Coprocess closed its stdout"""
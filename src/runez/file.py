@@ -1,9 +1,21 @@
+import errno
+import hashlib
 import io
 import logging
 import os
+import random
 import shutil
+import stat
+import sys
+import threading
 
-from runez.base import decode
+try:
+    import queue
+
+except ImportError:  # pragma: no cover, python2
+    import Queue as queue
+
+from runez.base import decode, Slotted, string_type
 from runez.convert import resolved_path, short
 from runez.path import ensure_folder, parent_folder
 from runez.system import abort, is_dryrun
@@ -13,7 +25,7 @@ LOG = logging.getLogger(__name__)
 TEXT_THRESHOLD_SIZE = 16384  # Max size in bytes to consider a file a "text file"
 
 
-def copy(source, destination, adapter=None, fatal=True, logger=LOG.debug):
+def copy(source, destination, adapter=None, fatal=True, logger=LOG.debug, workers=None):
     """
     Copy source -> destination
 
@@ -22,9 +34,10 @@ def copy(source, destination, adapter=None, fatal=True, logger=LOG.debug):
     :param callable adapter: Optional function to call on 'source' before copy
     :param bool|None fatal: Abort execution on failure if True
     :param callable|None logger: Logger to use
+    :param int|None workers: If > 1, copy files of a 'source' folder with that many threads (helps with many small files)
     :return int: 1 if effectively done, 0 if no-op, -1 on failure
     """
-    return _file_op(source, destination, _copy, adapter, fatal, logger)
+    return _file_op(source, destination, _copy, adapter, fatal, logger, workers=workers)
 
 
 def delete(path, fatal=True, logger=LOG.debug):
@@ -168,6 +181,197 @@ def symlink(source, destination, adapter=None, must_exist=True, fatal=True, logg
     return _file_op(source, destination, _symlink, adapter, fatal, logger, must_exist=must_exist)
 
 
+def sync(source, destination, checksum=False, delete_extra=False, fatal=True, logger=LOG.debug):
+    """
+    Sync source -> destination (rsync-style): copy only files that differ, leave up to date files untouched
+
+    :param str|None source: Source file or folder
+    :param str|None destination: Destination file or folder
+    :param bool checksum: If True, compare contents (via sha256) of files that have the same size, instead of mtime
+    :param bool delete_extra: If True, delete files/folders in 'destination' that don't exist in 'source'
+    :param bool|None fatal: Abort execution on failure if True
+    :param callable|None logger: Logger to use
+    :return SyncResult|None: Counts of copied/skipped/deleted files and bytes (what would be done in dryrun mode), None on failure
+    """
+    result = SyncResult()
+    if not source or not destination or source == destination:
+        return result
+
+    if not os.path.exists(source):
+        return abort("%s does not exist, can't sync to %s", short(source), short(destination), fatal=(fatal, None))
+
+    rsource = os.path.realpath(source)
+    rdest = os.path.realpath(destination)
+    if rsource == rdest:
+        return result
+
+    if rdest.startswith(rsource + os.path.sep):
+        return abort("Can't sync %s -> %s: destination contained in source", short(source), short(destination), fatal=(fatal, None))
+
+    dryrun = is_dryrun()
+    try:
+        if os.path.isdir(source) and not os.path.islink(source):
+            _sync_folder(source, destination, checksum, delete_extra, dryrun, result)
+
+        else:
+            if not dryrun:
+                ensure_folder(destination, fatal=fatal, logger=None)
+
+            _sync_entry(source, destination, os.lstat(source), checksum, dryrun, result)
+
+    except Exception as e:
+        return abort("Can't sync %s -> %s: %s", short(source), short(destination), e, fatal=(fatal, None))
+
+    if dryrun:
+        LOG.debug("Would sync %s -> %s: %s", short(source), short(destination), result)
+
+    elif logger:
+        logger("Synced %s -> %s: %s", short(source), short(destination), result)
+
+    return result
+
+
+class SyncResult(Slotted):
+    """Outcome of sync()"""
+
+    __slots__ = ["copied", "copied_bytes", "skipped", "skipped_bytes", "deleted", "deleted_bytes"]
+
+    _default = 0
+
+    def __repr__(self):
+        return "copied %s files (%s bytes), skipped %s (%s bytes), deleted %s (%s bytes)" % (
+            self.copied, self.copied_bytes, self.skipped, self.skipped_bytes, self.deleted, self.deleted_bytes
+        )
+
+
+def _sync_folder(source, destination, checksum, delete_extra, dryrun, result):
+    """
+    :param str source: Source folder
+    :param str destination: Destination folder
+    :param bool checksum: If True, compare contents of files that have the same size, instead of mtime
+    :param bool delete_extra: If True, delete entries in 'destination' that don't exist in 'source'
+    :param bool dryrun: If True, don't modify anything, just count what would be done
+    :param SyncResult result: Result to fill
+    """
+    if os.path.lexists(destination) and (os.path.islink(destination) or not os.path.isdir(destination)):
+        _sync_delete(destination, dryrun, result)
+
+    if not dryrun and not os.path.isdir(destination):
+        os.makedirs(destination)
+
+    existing = set(_listdir(destination)) if os.path.isdir(destination) else set()
+    for name in sorted(_listdir(source)):
+        existing.discard(name)
+        src = os.path.join(source, name)
+        dst = os.path.join(destination, name)
+        st = os.lstat(src)
+        if stat.S_ISDIR(st.st_mode):
+            _sync_folder(src, dst, checksum, delete_extra, dryrun, result)
+
+        else:
+            _sync_entry(src, dst, st, checksum, dryrun, result)
+
+    if delete_extra:
+        for name in existing:
+            _sync_delete(os.path.join(destination, name), dryrun, result)
+
+    if not dryrun:
+        shutil.copystat(source, destination)
+
+
+def _sync_entry(source, destination, st, checksum, dryrun, result):
+    """
+    :param str source: Source file or symlink
+    :param str destination: Destination
+    :param os.stat_result st: lstat() of 'source'
+    :param bool checksum: If True, compare contents of files that have the same size, instead of mtime
+    :param bool dryrun: If True, don't modify anything, just count what would be done
+    :param SyncResult result: Result to fill
+    """
+    try:
+        dst = os.lstat(destination)
+
+    except OSError:
+        dst = None
+
+    if dst is not None and _is_same(source, destination, st, dst, checksum):
+        result.skipped += 1
+        result.skipped_bytes += st.st_size
+        if checksum and not dryrun and int(st.st_mtime) != int(dst.st_mtime) and not stat.S_ISLNK(st.st_mode):
+            shutil.copystat(source, destination)  # So that next non-checksum sync sees file as up to date
+
+        return
+
+    if dst is not None and not (stat.S_ISREG(st.st_mode) and stat.S_ISREG(dst.st_mode)):
+        _sync_delete(destination, dryrun, result)  # Only regular files can be overwritten in place
+
+    result.copied += 1
+    result.copied_bytes += st.st_size
+    if not dryrun:
+        if stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(source), destination)
+
+        else:
+            _copy_file(source, destination)
+
+
+def _is_same(source, destination, st, dst, checksum):
+    """
+    :return bool: True if 'destination' is up to date w.r.t. 'source'
+    """
+    if stat.S_ISLNK(st.st_mode) or stat.S_ISLNK(dst.st_mode):
+        return stat.S_ISLNK(st.st_mode) and stat.S_ISLNK(dst.st_mode) and os.readlink(source) == os.readlink(destination)
+
+    if not stat.S_ISREG(dst.st_mode) or st.st_size != dst.st_size:
+        return False
+
+    if checksum:
+        return _file_hash(source) == _file_hash(destination)
+
+    return int(st.st_mtime) == int(dst.st_mtime)  # Same 1 second granularity as rsync
+
+
+def _sync_delete(path, dryrun, result):
+    """
+    :param str path: File, symlink or folder to delete
+    :param bool dryrun: If True, don't delete anything, just count what would be deleted
+    :param SyncResult result: Result to fill
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        for name in _listdir(path):
+            _sync_delete(os.path.join(path, name), dryrun, result)
+
+        if not dryrun:
+            os.rmdir(path)
+
+        return
+
+    result.deleted += 1
+    result.deleted_bytes += os.lstat(path).st_size
+    if not dryrun:
+        os.unlink(path)
+
+
+def _listdir(path):
+    if hasattr(os, "scandir"):
+        return [entry.name for entry in os.scandir(path)]
+
+    return os.listdir(path)  # pragma: no cover, python2
+
+
+def _file_hash(path):
+    """
+    :param str path: Path to file
+    :return str: sha256 of file's contents
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
 def touch(path, fatal=True, logger=None):
     """
     :param str|None path: Path to file to touch
@@ -177,46 +381,411 @@ def touch(path, fatal=True, logger=None):
     return write(path, "", fatal=fatal, logger=logger)
 
 
-def write(path, contents, fatal=True, logger=None):
+def write(path, contents, fatal=True, logger=None, atomic=False, fsync=None, buffer_size=None):
     """
     :param str|None path: Path to file
-    :param str|None contents: Contents to write
+    :param str|bytes|memoryview|iterable|None contents: Contents to write, iterables of str/bytes chunks are written as they come
     :param bool|None fatal: Abort execution on failure if True
     :param callable|None logger: Logger to use
+    :param bool atomic: If True, write to a temp file first, then rename it to 'path' (readers never see partial content)
+    :param str|None fsync: Durability: None (leave it to the OS), "file" (fsync file), or "dir" (fsync file and its folder)
+    :param int|None buffer_size: Size of write buffer, in bytes (default: io.DEFAULT_BUFFER_SIZE)
     :return int: 1 if effectively done, 0 if no-op, -1 on failure
     """
     if not path:
         return 0
 
+    size = _content_size(contents)
     if is_dryrun():
-        action = "write %s bytes to" % len(contents) if contents else "touch"
+        action = "write %s bytes to" % size if size else "write to" if contents else "touch"
         LOG.debug("Would %s %s", action, short(path))
         return 1
 
     ensure_folder(path, fatal=fatal, logger=logger)
-    if logger and contents:
-        logger("Writing %s bytes to %s", len(contents), short(path))
+    if logger and size:
+        logger("Writing %s bytes to %s", size, short(path))
 
+    buffering = buffer_size or -1
     try:
-        with io.open(path, "wt") as fh:
+        if contents and size is None:
+            with AtomicOutput(path, "wb", atomic=atomic, fsync=fsync, buffering=buffering) as fh:
+                size = _write_chunks(fh, contents)
+
+            if logger:
+                logger("Wrote %s bytes to %s", size, short(path))
+
+            return 1
+
+        text = not isinstance(contents, (bytes, bytearray, memoryview))
+        with AtomicOutput(path, "wt" if text else "wb", atomic=atomic, fsync=fsync, buffering=buffering) as fh:
             if contents:
-                fh.write(decode(contents))
-            else:
+                fh.write(decode(contents) if text else contents)
+
+            elif not atomic:
                 os.utime(path, None)
+
         return 1
 
     except Exception as e:
         return abort("Can't write to %s: %s", short(path), e, fatal=(fatal, -1))
 
 
-def _copy(source, destination):
+def _content_size(contents):
+    """
+    :param str|bytes|memoryview|iterable|None contents: Contents to write
+    :return int|None: Size of 'contents', None if it's an iterable (size known only once all chunks are written)
+    """
+    if contents is None or isinstance(contents, (string_type, bytes, bytearray)):
+        return len(contents or "")
+
+    if isinstance(contents, memoryview):
+        return len(contents.tobytes()) if sys.version_info[0] < 3 else contents.nbytes
+
+    return None
+
+
+def _write_chunks(fh, chunks):
+    """
+    :param file fh: File opened in binary mode
+    :param iterable chunks: Chunks to write (str chunks are utf-8 encoded)
+    :return int: Number of bytes written
+    """
+    written = 0
+    for chunk in chunks:
+        if not isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = chunk.encode("utf-8")
+
+        fh.write(chunk)
+        written += _content_size(chunk)
+
+    return written
+
+
+class AtomicOutput(object):
+    """
+    Open 'path' for writing, optionally atomically (via a temp file in the same folder, renamed on success) and durably
+
+    Usage:
+        with AtomicOutput("foo.txt", "wt", atomic=True, fsync="dir") as fh:
+            fh.write("...")
+    """
+
+    def __init__(self, path, mode="wt", atomic=True, fsync=None, buffering=-1):
+        """
+        :param str path: Path to file to write
+        :param str mode: Mode to open file with ("wt" or "wb")
+        :param bool atomic: If True, write to a temp file first, then rename it to 'path' (left untouched on failure)
+        :param str|None fsync: Durability: None (leave it to the OS), "file" (fsync file), or "dir" (fsync file and its folder)
+        :param int buffering: Passed through to io.open()
+        """
+        if fsync not in (None, "file", "dir"):
+            raise ValueError("Invalid fsync '%s', expecting one of: file, dir" % fsync)
+
+        self.path = path
+        self.mode = mode
+        self.atomic = atomic
+        self.fsync = fsync
+        self.buffering = buffering
+        self.temp_path = None
+        self.fh = None
+
+    def __repr__(self):
+        return short(self.path)
+
+    def __enter__(self):
+        if self.atomic:
+            fd, self.temp_path = _create_temp(self.path)
+            self.fh = io.open(fd, self.mode, buffering=self.buffering)
+
+        else:
+            self.fh = io.open(self.path, self.mode, buffering=self.buffering)
+
+        return self.fh
+
+    def __exit__(self, exc_type, *_):
+        completed = False
+        try:
+            if exc_type is None:
+                self.fh.flush()
+                if self.fsync:
+                    os.fsync(self.fh.fileno())
+
+                completed = True
+
+        finally:
+            self.fh.close()
+            if self.temp_path and not completed:
+                os.unlink(self.temp_path)  # Leave 'path' untouched if anything went wrong
+
+        if not completed:
+            return
+
+        if self.temp_path:
+            if sys.version_info[0] >= 3:
+                os.replace(self.temp_path, self.path)
+
+            else:  # pragma: no cover, python2 (os.rename() is atomic on posix)
+                os.rename(self.temp_path, self.path)
+
+        if self.fsync == "dir":
+            FsyncBatch.fsync_folder(os.path.dirname(os.path.abspath(self.path)))
+
+
+class FsyncBatch(object):
+    """
+    Defer folder fsyncs (requested via fsync="dir") to the end of the batch, doing them once per folder
+
+    Usage:
+        with FsyncBatch():
+            for path, contents in files.items():
+                runez.write(path, contents, atomic=True, fsync="dir")
+    """
+
+    _local = threading.local()
+
+    def __init__(self):
+        self.folders = set()
+        self._previous = None
+
+    def __repr__(self):
+        return "%s pending folder fsyncs" % len(self.folders)
+
+    def __enter__(self):
+        self._previous = getattr(self._local, "batch", None)
+        self._local.batch = self
+        return self
+
+    def __exit__(self, *_):
+        self._local.batch = self._previous
+        for folder in sorted(self.folders):
+            FsyncBatch.fsync_folder(folder)
+
+    @classmethod
+    def fsync_folder(cls, folder):
+        """
+        :param str folder: Folder to fsync (now, or at the end of current batch, if any)
+        """
+        batch = getattr(cls._local, "batch", None)
+        if batch is not None:
+            batch.folders.add(folder)
+            return
+
+        fd = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+
+        finally:
+            os.close(fd)
+
+
+def _create_temp(path):
+    """
+    Temp file is created with mode 0o666 (so that the OS applies current umask, as a regular open() would),
+    then given the mode of 'path' if 'path' already exists
+
+    :param str path: Path to file about to be written
+    :return (int, str): File descriptor and path of a new temp file, in the same folder as 'path'
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_CLOEXEC", 0)
+    while True:
+        temp_path = os.path.join(folder, ".%s.%08x.tmp" % (name, random.getrandbits(32)))
+        try:
+            fd = os.open(temp_path, flags, 0o666)
+            break
+
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    try:
+        os.fchmod(fd, stat.S_IMODE(os.stat(path).st_mode))
+
+    except OSError:  # 'path' doesn't exist yet
+        pass
+
+    return fd, temp_path
+
+
+def _copy(source, destination, workers=None):
     """Effective copy"""
     if os.path.isdir(source):
-        shutil.copytree(source, destination, symlinks=True)
+        strategies = set()
+        if workers and workers > 1 and hasattr(os, "scandir"):
+            _parallel_copytree(source, destination, workers, strategies)
+
+        elif sys.version_info[0] >= 3:
+            shutil.copytree(source, destination, symlinks=True, copy_function=lambda s, d: strategies.add(_copy_file(s, d)))
+
+        else:  # pragma: no cover, python2
+            shutil.copytree(source, destination, symlinks=True)
+            strategies.add("shutil")
+
     else:
-        shutil.copy(source, destination)
+        strategies = {_copy_file(source, destination)}
 
     shutil.copystat(source, destination)  # Make sure last modification time is preserved
+    return ", ".join(sorted(strategies))
+
+
+# Copy strategies, from fastest to slowest: reflink (copy-on-write clone, no data copied at all),
+# copy_file_range (in-kernel copy, server-side on NFS), sendfile (in-kernel copy), and shutil (through user space)
+COPY_STRATEGIES = ("reflink", "copy_file_range", "sendfile", "shutil")
+FICLONE = 0x40049409  # From linux/fs.h: _IOW(0x94, 9, int)
+_UNSUPPORTED_COPIES = set()  # (strategy, source device, destination device) combinations known to not work
+_UNSUPPORTED_ERRNOS = {errno.EBADF, errno.EINVAL, errno.ENOSYS, errno.ENOTSUP, errno.ENOTTY, errno.EOPNOTSUPP, errno.EPERM, errno.EXDEV}
+
+
+def _copy_file(source, destination):
+    """
+    Copy file 'source' to 'destination' (contents and mode), with the fastest strategy available
+
+    :param str source: Source file
+    :param str destination: Destination file
+    :return str: Strategy used, one of COPY_STRATEGIES
+    """
+    if stat.S_ISFIFO(os.stat(source).st_mode):
+        raise shutil.SpecialFileError("%s is a named pipe" % source)
+
+    with open(source, "rb") as fsrc:
+        with open(destination, "wb") as fdst:
+            src_fd = fsrc.fileno()
+            dst_fd = fdst.fileno()
+            st = os.fstat(src_fd)
+            devices = (st.st_dev, os.fstat(dst_fd).st_dev)
+            strategies = COPY_STRATEGIES[:-1] if st.st_size else ()  # Pseudo-files (such as in /proc) report a size of 0
+            for strategy in strategies:
+                if (strategy, devices) not in _UNSUPPORTED_COPIES:
+                    try:
+                        _KERNEL_COPIES[strategy](src_fd, dst_fd)
+                        if os.fstat(dst_fd).st_size == st.st_size:
+                            break
+
+                    except AttributeError:  # Not available in this python version, or on this platform
+                        _UNSUPPORTED_COPIES.add((strategy, devices))
+
+                    except (IOError, OSError) as e:
+                        if e.errno in _UNSUPPORTED_ERRNOS:
+                            _UNSUPPORTED_COPIES.add((strategy, devices))
+
+                    os.lseek(src_fd, 0, os.SEEK_SET)
+                    os.ftruncate(dst_fd, 0)
+                    os.lseek(dst_fd, 0, os.SEEK_SET)
+
+            else:
+                strategy = "shutil"
+                shutil.copyfileobj(fsrc, fdst)
+
+    shutil.copystat(source, destination)
+    return strategy
+
+
+def _parallel_copytree(source, destination, workers, strategies):
+    """
+    Like shutil.copytree(symlinks=True), but with files copied by 'workers' threads
+
+    Folder skeleton is created first (via os.scandir()), then files are copied in parallel,
+    then folders' stats are copied (deepest first, so that their modification time is preserved)
+
+    :param str source: Source folder
+    :param str destination: Destination folder
+    :param int workers: Number of threads to use
+    :param set strategies: Copy strategies used (see COPY_STRATEGIES) are added to this set
+    """
+    files = queue.Queue()
+    errors = []
+    folders = _copy_skeleton(source, destination, files, errors)
+    threads = [threading.Thread(target=_copy_files, args=(files, strategies, errors)) for _ in range(min(workers, files.qsize()))]
+    for t in threads:
+        t.start()
+
+    for t in threads:
+        t.join()
+
+    for src, dst in reversed(folders):
+        try:
+            shutil.copystat(src, dst)
+
+        except (IOError, OSError) as e:  # pragma: no cover
+            errors.append((src, dst, str(e)))
+
+    if errors:
+        raise shutil.Error(errors)
+
+
+def _copy_skeleton(source, destination, files, errors):
+    """
+    :param str source: Source folder
+    :param str destination: Destination folder
+    :param queue.Queue files: (source, destination) files to copy are added to this queue
+    :param list errors: Errors encountered are added to this list
+    :return list: (source, destination) folders created, parents first
+    """
+    folders = [(source, destination)]
+    i = 0
+    while i < len(folders):
+        src, dst = folders[i]
+        i += 1
+        os.makedirs(dst)
+        for entry in os.scandir(src):
+            target = os.path.join(dst, entry.name)
+            if entry.is_symlink():
+                try:
+                    os.symlink(os.readlink(entry.path), target)
+                    shutil.copystat(entry.path, target, follow_symlinks=False)
+
+                except (IOError, OSError) as e:
+                    errors.append((entry.path, target, str(e)))
+
+            elif entry.is_dir():
+                folders.append((entry.path, target))
+
+            else:
+                files.put((entry.path, target))
+
+    return folders
+
+
+def _copy_files(files, strategies, errors):
+    """
+    :param queue.Queue files: (source, destination) files to copy
+    :param set strategies: Copy strategies used are added to this set
+    :param list errors: Errors encountered are added to this list
+    """
+    while True:
+        try:
+            src, dst = files.get_nowait()
+
+        except queue.Empty:
+            return
+
+        try:
+            strategies.add(_copy_file(src, dst))
+
+        except (IOError, OSError, shutil.Error) as e:
+            errors.append((src, dst, str(e)))
+
+
+def _reflink(src_fd, dst_fd):
+    import fcntl
+
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd, dst_fd):
+    while os.copy_file_range(src_fd, dst_fd, 1 << 30):
+        pass
+
+
+def _sendfile(src_fd, dst_fd):
+    offset = 0
+    sent = True
+    while sent:
+        sent = os.sendfile(dst_fd, src_fd, offset, 1 << 30)
+        offset += sent
+
+
+_KERNEL_COPIES = {"reflink": _reflink, "copy_file_range": _copy_file_range, "sendfile": _sendfile}
 
 
 def _move(source, destination):
@@ -229,9 +798,9 @@ def _symlink(source, destination):
     os.symlink(source, destination)
 
 
-def _file_op(source, destination, func, adapter, fatal, logger, must_exist=True):
+def _file_op(source, destination, func, adapter, fatal, logger, must_exist=True, **kwargs):
     """
-    Call func(source, destination)
+    Call func(source, destination, **kwargs)
 
     :param str|None source: Source file or folder
     :param str|None destination: Destination file or folder
@@ -240,6 +809,7 @@ def _file_op(source, destination, func, adapter, fatal, logger, must_exist=True)
     :param bool|None fatal: Abort execution on failure if True
     :param callable|None logger: Logger to use
     :param bool must_exist: If True, verify that source does indeed exist
+    :param kwargs: Passed through to 'func'
     :return int: 1 if effectively done, 0 if no-op, -1 on failure
     """
     if not source or not destination or source == destination:
@@ -266,12 +836,15 @@ def _file_op(source, destination, func, adapter, fatal, logger, must_exist=True)
         delete(destination, fatal=fatal, logger=None)
         ensure_folder(destination, fatal=fatal, logger=None)
 
+        note = ""
+        if logger and adapter:
+            note = adapter(source, destination, fatal=fatal, logger=logger)
+
+        strategy = func(source, destination, **kwargs)
         if logger:
-            note = adapter(source, destination, fatal=fatal, logger=logger) if adapter else ""
-            if logger:
-                logger("%s %s %s %s%s", action.title(), short(source), indicator, short(destination), note)
+            strategy = " (%s)" % strategy if strategy else ""
+            logger("%s %s %s %s%s%s", action.title(), short(source), indicator, short(destination), strategy, note)
 
-        func(source, destination)
         return 1
 
     except Exception as e:
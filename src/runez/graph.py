@@ -0,0 +1,302 @@
+"""
+Make-like execution of inter-dependent steps (programs to run, files to generate etc)
+
+Steps declare their inputs and outputs, a step depends on the steps producing its inputs.
+Steps whose outputs are up to date (w.r.t. mtime or content hash of their inputs) are skipped,
+independent steps are ran in parallel.
+
+Usage:
+    from runez.graph import TaskGraph
+
+    graph = TaskGraph(max_workers=4)
+    graph.add("compile", ["gcc", "-c", "foo.c", "-o", "foo.o"], inputs=["foo.c"], outputs=["foo.o"])
+    graph.add("link", ["gcc", "foo.o", "-o", "foo"], inputs=["foo.o"], outputs=["foo"])
+    graph.add("readme", lambda: runez.write("README", "..."), outputs=["README"])
+    graph.run()
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+try:
+    import queue
+
+except ImportError:  # pragma: no cover, python2
+    import Queue as queue
+
+from runez.convert import represented_args, short
+from runez.program import run
+from runez.serialize import read_json, save_json
+from runez.system import abort, is_dryrun
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Step(object):
+    """One step of a TaskGraph"""
+
+    def __init__(self, name, action, inputs=None, outputs=None, depends=None, check="mtime"):
+        """
+        :param str name: Name of this step (must be unique within its graph)
+        :param callable|list|tuple action: Function to call, or command to run (program followed by its args, see run())
+        :param list|None inputs: Files this step reads
+        :param list|None outputs: Files this step produces (step always runs if it declares no outputs)
+        :param list|None depends: Names of other steps that must complete first (in addition to producers of 'inputs')
+        :param str check: How to determine if step is up to date: "mtime" (outputs newer than inputs), or "hash" (of inputs)
+        """
+        if check not in ("mtime", "hash"):
+            raise ValueError("Invalid check '%s' for step '%s'" % (check, name))
+
+        self.name = name
+        self.action = action
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.depends = set(depends or [])
+        self.check = check
+        self.status = None  # One of: "ran", "skipped", "failed" (None if step did not get to run)
+        self.duration = None  # How long the step took to run, in seconds
+        self.exception = None  # Exception raised by step, if any
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def description(self):
+        """Short description of what this step does, for logging purposes"""
+        if callable(self.action):
+            return getattr(self.action, "__name__", str(self.action))
+
+        return "%s %s" % (short(self.action[0]), represented_args(self.action[1:]))
+
+    def fingerprint(self):
+        """
+        :return str: Hash of this step's action and inputs' contents (used when 'check' is "hash")
+        """
+        h = hashlib.sha256(self.description.encode("utf-8"))
+        for path in self.inputs:
+            h.update(path.encode("utf-8") + b"\0")
+            if os.path.isfile(path):
+                with open(path, "rb") as fh:
+                    for chunk in iter(lambda: fh.read(65536), b""):
+                        h.update(chunk)
+
+        return h.hexdigest()
+
+    def is_up_to_date(self, state):
+        """
+        :param dict state: Fingerprints of previous successful runs, per step name
+        :return bool: True if all outputs of this step are up to date
+        """
+        if not self.outputs or not all(os.path.exists(p) for p in self.outputs):
+            return False
+
+        if self.check == "hash":
+            return state.get(self.name) == self.fingerprint()
+
+        inputs = [os.path.getmtime(p) for p in self.inputs if os.path.exists(p)]
+        if len(inputs) < len(self.inputs):
+            return False
+
+        return not inputs or min(os.path.getmtime(p) for p in self.outputs) >= max(inputs)
+
+    def execute(self):
+        started = time.time()
+        try:
+            if callable(self.action):
+                self.action()
+
+            else:
+                result = run(self.action[0], *self.action[1:], fatal=False, as_result=True)
+                if not result.succeeded:
+                    raise Exception(result.error or "exited with code %s" % result.exit_code)
+
+            self.status = "ran"
+
+        except BaseException as e:  # AbortException may be configured to be SystemExit
+            self.status = "failed"
+            self.exception = e
+
+        self.duration = time.time() - started
+
+
+class TaskGraph(object):
+    """Steps to execute, in dependency order, with up to 'max_workers' of them running at the same time"""
+
+    def __init__(self, max_workers=4, state_path=None):
+        """
+        :param int max_workers: Max number of steps to run concurrently
+        :param str|None state_path: Json file where to remember fingerprints of steps with check="hash" (kept in memory if None)
+        """
+        self.max_workers = max_workers
+        self.state_path = state_path
+        self.steps = []  # type: list[Step]
+        self._state = None
+
+    def __repr__(self):
+        return "%s steps" % len(self.steps)
+
+    def add(self, name, action, inputs=None, outputs=None, depends=None, check="mtime"):
+        """
+        :return Step: Added step (see Step for description of arguments)
+        """
+        if any(s.name == name for s in self.steps):
+            raise ValueError("Step '%s' is already defined" % name)
+
+        step = Step(name, action, inputs=inputs, outputs=outputs, depends=depends, check=check)
+        self.steps.append(step)
+        return step
+
+    def dependencies(self, step):
+        """
+        :param Step step: Step to examine
+        :return set[Step]: Steps that must complete before 'step' can run
+        """
+        by_name = dict((s.name, s) for s in self.steps)
+        unknown = [name for name in step.depends if name not in by_name]
+        if unknown:
+            raise ValueError("Step '%s' depends on unknown step(s): %s" % (step.name, ", ".join(sorted(unknown))))
+
+        result = set(by_name[name] for name in step.depends)
+        inputs = set(os.path.abspath(p) for p in step.inputs)
+        for other in self.steps:
+            if other is not step and any(os.path.abspath(p) in inputs for p in other.outputs):
+                result.add(other)
+
+        return result
+
+    def plan(self):
+        """
+        :return list[Step]: All steps, in an order that respects dependencies (raises ValueError on dependency cycles)
+        """
+        pending = dict((s, self.dependencies(s)) for s in self.steps)
+        result = []
+        while pending:
+            ready = [s for s in self.steps if s in pending and not pending[s]]
+            if not ready:
+                raise ValueError("Dependency cycle between steps: %s" % ", ".join(s.name for s in self.steps if s in pending))
+
+            for step in ready:
+                result.append(step)
+                del pending[step]
+
+            for deps in pending.values():
+                deps.difference_update(ready)
+
+        return result
+
+    def run(self, fatal=True, logger=LOG.debug):
+        """
+        Run all steps that are not up to date, in dependency order (in parallel when possible)
+
+        :param bool|None fatal: Abort execution on failure if True
+        :param callable|None logger: Logger to use
+        :return int: Number of steps that ran, -1 on failure
+        """
+        try:
+            plan = self.plan()
+
+        except ValueError as e:
+            return abort(str(e), fatal=(fatal, -1))
+
+        for step in plan:
+            step.status = step.duration = step.exception = None
+
+        if is_dryrun():
+            return self._dryrun(plan)
+
+        started = time.time()
+        failed = self._execute(plan, logger)
+        self._save_state()
+        ran = [s for s in plan if s.status == "ran"]
+        if failed:
+            return abort("Step '%s' failed: %s", failed, failed.exception, fatal=(fatal, -1))
+
+        if logger:
+            logger("Ran %s steps (%s up to date) in %.2fs", len(ran), len(plan) - len(ran), time.time() - started)
+
+        return len(ran)
+
+    @property
+    def state(self):
+        """Fingerprints of steps with check="hash", as of their last successful run"""
+        if self._state is None:
+            self._state = {}
+            if self.state_path:
+                self._state = read_json(self.state_path, default={}, fatal=False)
+
+        return self._state
+
+    def _dryrun(self, plan):
+        """Log what would be done, steps depending on a step that would run are assumed to not be up to date"""
+        would_run = set()
+        for step in plan:
+            if self.dependencies(step) & would_run or not step.is_up_to_date(self.state):
+                would_run.add(step)
+                LOG.debug("Would run step '%s': %s", step, step.description)
+
+            else:
+                LOG.debug("Step '%s' is up to date", step)
+
+        return len(would_run)
+
+    def _execute(self, plan, logger):
+        """
+        :param list[Step] plan: Steps to execute
+        :param callable|None logger: Logger to use
+        :return Step|None: First step that failed, if any
+        """
+        pending = dict((s, self.dependencies(s)) for s in plan)
+        completed = queue.Queue()
+        running = 0
+        failed = None
+        while pending or running:
+            ready = [s for s in plan if s in pending and not pending[s]] if failed is None else []
+            for step in ready[:self.max_workers - running]:
+                del pending[step]
+                if step.is_up_to_date(self.state):
+                    step.status = "skipped"
+                    if logger:
+                        logger("Step '%s' is up to date", step)
+
+                    completed.put(step)
+
+                else:
+                    if logger:
+                        logger("Running step '%s': %s", step, step.description)
+
+                    t = threading.Thread(target=self._work, args=(step, completed), name="TaskGraph-%s" % step.name)
+                    t.daemon = True
+                    t.start()
+
+                running += 1
+
+            if not running:
+                break  # A step failed, remaining steps won't run
+
+            step = completed.get()
+            running -= 1
+            if step.status == "failed":
+                failed = failed or step
+
+            else:
+                if step.status == "ran" and step.check == "hash":
+                    self.state[step.name] = step.fingerprint()
+
+                for deps in pending.values():
+                    deps.discard(step)
+
+        return failed
+
+    @staticmethod
+    def _work(step, completed):
+        step.execute()
+        completed.put(step)
+
+    def _save_state(self):
+        if self.state_path and self._state is not None:
+            if self._state != read_json(self.state_path, default={}, fatal=False):
+                save_json(self._state, self.state_path, fatal=False)
@@ -0,0 +1,194 @@
+"""
+Callbacks fired whenever a program is started or exits, and per-program statistics aggregated from them
+
+Usage:
+    from runez.hooks import RunStats
+
+    stats = RunStats().start()
+    ...
+    print(stats.report())
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+from runez.base import Slotted
+from runez.convert import represented_args, short
+
+
+LOG = logging.getLogger(__name__)
+
+
+class RunEvent(Slotted):
+    """Passed to RunHooks callbacks: what program was started (and how it went, once it exited)"""
+
+    __slots__ = ["program", "args", "pid", "exit_code", "usage", "output_size", "error_size"]
+
+    def __repr__(self):
+        return "%s %s" % (short(self.program), represented_args(self.args))
+
+    @property
+    def duration(self):
+        """Wall time the program took to run, in seconds (once it exited)"""
+        return self.usage and self.usage.wall_time
+
+
+class RunHooks(object):
+    """
+    Callbacks fired whenever a program is started or exits (via run(), iter_run(), run_pipeline() etc)
+
+    Usage:
+        def report(event):
+            metrics.timing(runez.basename(event.program), event.duration)
+
+        RunHooks.add(on_finish=report)
+    """
+
+    on_start = []  # type: list[callable] # Called with a RunEvent right after program was started
+    on_finish = []  # type: list[callable] # Called with a RunEvent right after program exited
+
+    @classmethod
+    def add(cls, on_start=None, on_finish=None):
+        """
+        :param callable|None on_start: Callback to call when a program is started
+        :param callable|None on_finish: Callback to call when a program exits
+        """
+        if on_start is not None and on_start not in cls.on_start:
+            cls.on_start.append(on_start)
+
+        if on_finish is not None and on_finish not in cls.on_finish:
+            cls.on_finish.append(on_finish)
+
+    @classmethod
+    def remove(cls, callback):
+        """
+        :param callable callback: Callback to unregister (from both 'on_start' and 'on_finish')
+        """
+        for hooks in (cls.on_start, cls.on_finish):
+            if callback in hooks:
+                hooks.remove(callback)
+
+    @classmethod
+    def fire(cls, hooks, event):
+        """
+        :param list hooks: Callbacks to call
+        :param RunEvent event: Event to pass to callbacks
+        """
+        for callback in list(hooks):
+            try:
+                callback(event)
+
+            except Exception as e:
+                LOG.warning("Run hook %s crashed:", callback, exc_info=e)
+
+
+class ProgramStats(object):
+    """Statistics for one program, as aggregated by RunStats"""
+
+    def __init__(self, program, max_samples=1000):
+        """
+        :param str program: Basename of program
+        :param int max_samples: Max number of durations to keep around for computing percentiles
+        """
+        self.program = program
+        self.max_samples = max_samples
+        self.count = 0
+        self.failures = 0
+        self.total_time = 0.0
+        self.durations = []
+
+    def __repr__(self):
+        return "%s: %s runs, %.3fs total, %.3fs avg, %.3fs p95, %.0f%% failed" % (
+            self.program, self.count, self.total_time, self.average, self.p95, self.failure_rate * 100
+        )
+
+    @property
+    def average(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    @property
+    def p95(self):
+        """95th percentile of durations (computed on the last 'max_samples' runs)"""
+        if not self.durations:
+            return 0.0
+
+        durations = sorted(self.durations)
+        return durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+
+    @property
+    def failure_rate(self):
+        return float(self.failures) / self.count if self.count else 0.0
+
+    def record(self, duration, exit_code):
+        """
+        :param float duration: Wall time of a run, in seconds
+        :param int exit_code: Exit code of the run
+        """
+        self.count += 1
+        self.total_time += duration
+        if exit_code:
+            self.failures += 1
+
+        self.durations.append(duration)
+        if len(self.durations) > self.max_samples:
+            del self.durations[0]
+
+
+class RunStats(object):
+    """
+    Per-program statistics (count, total/avg/p95 latency, failure rate), aggregated via RunHooks
+
+    Usage:
+        stats = RunStats().start()
+        ...
+        print(stats.report())
+    """
+
+    def __init__(self, max_samples=1000):
+        """
+        :param int max_samples: Max number of durations to keep around per program, for computing percentiles
+        """
+        self.max_samples = max_samples
+        self.programs = {}  # type: dict[str, ProgramStats]
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "%s programs" % len(self.programs)
+
+    def start(self):
+        """Start aggregating statistics"""
+        RunHooks.add(on_finish=self.record)
+        return self
+
+    def stop(self):
+        """Stop aggregating statistics"""
+        RunHooks.remove(self.record)
+
+    def record(self, event):
+        """
+        :param RunEvent event: Program that exited
+        """
+        name = os.path.basename(event.program)
+        with self._lock:
+            stats = self.programs.get(name)
+            if stats is None:
+                stats = self.programs[name] = ProgramStats(name, max_samples=self.max_samples)
+
+            stats.record(event.duration or 0, event.exit_code)
+
+    def report(self):
+        """
+        :return str: One line per program, programs that took the most time overall first
+        """
+        with self._lock:
+            programs = sorted(self.programs.values(), key=lambda x: -x.total_time)
+            return "\n".join(str(p) for p in programs)
+
+    def dump_at_exit(self, logger=LOG.info):
+        """
+        :param callable logger: Logger to use to report statistics when python exits
+        """
+        atexit.register(lambda: self.programs and logger("Programs ran:\n%s" % self.report()))
+        return self
@@ -0,0 +1,220 @@
+"""
+Run programs concurrently
+
+Usage:
+    from runez.pool import RunPool
+
+    with RunPool(max_workers=8) as pool:
+        for repo in repos:
+            pool.submit("git", "-C", repo, "fetch", fatal=False)
+"""
+
+import logging
+import threading
+import time
+
+try:
+    import queue
+
+except ImportError:  # pragma: no cover, python2
+    import Queue as queue
+
+from runez.convert import flattened, represented_args, SHELL, short
+from runez.program import run
+
+
+LOG = logging.getLogger(__name__)
+
+
+class RunTask(object):
+    """Program to run as part of a RunPool, outcome of the run is available once it completed"""
+
+    def __init__(self, program, args, kwargs):
+        """
+        :param str program: Program to run
+        :param tuple args: Command line args
+        :param dict kwargs: Keyword args for run()
+        """
+        self.program = program
+        self.args = args
+        self.kwargs = kwargs
+        self.output = None  # What run() returned
+        self.exception = None  # Exception raised by run(), if any (for example: AbortException when 'fatal' is True)
+        self.duration = None  # How long the run took, in seconds
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return "%s %s" % (short(self.program), represented_args(flattened(self.args, split=SHELL)))
+
+    @property
+    def is_done(self):
+        return self._done.is_set()
+
+    def execute(self):
+        started = time.time()
+        try:
+            self.output = run(self.program, *self.args, **self.kwargs)
+
+        except BaseException as e:  # AbortException may be configured to be SystemExit
+            self.exception = e
+
+        self.duration = time.time() - started
+        self._done.set()
+
+    def result(self, timeout=None):
+        """
+        :param float|None timeout: Max time to wait for completion, in seconds (wait indefinitely if None)
+        :return: What run() returned (re-raises what run() raised, respecting the 'fatal' setting of this task)
+        """
+        self._done.wait(timeout)
+        if self.exception is not None:
+            raise self.exception
+
+        return self.output
+
+
+class RunPool(object):
+    """
+    Run programs concurrently, with at most 'max_workers' of them running at the same time
+
+    Usage:
+        with RunPool(max_workers=8) as pool:
+            for repo in repos:
+                pool.submit("git", "-C", repo, "fetch", fatal=False)
+
+        for task in pool.tasks:
+            print(task, task.output)
+    """
+
+    def __init__(self, max_workers=8, logger=LOG.debug, path_env=None):
+        """
+        :param int max_workers: Max number of programs to run concurrently
+        :param callable|None logger: Logger to use to report timing summary
+        :param dict|EnvProfile|None path_env: Default 'path_env' for submitted programs (an EnvProfile avoids recomputing env)
+        """
+        self.max_workers = max_workers
+        self.logger = logger
+        self.path_env = path_env
+        self.tasks = []  # type: list[RunTask]
+        self.started = None  # Epoch when first task was submitted
+        self.finished = None  # Epoch when last task completed
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._completed = queue.Queue()
+        self._workers = 0
+
+    def __repr__(self):
+        return "%s tasks" % len(self.tasks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.wait()
+
+    @property
+    def elapsed(self):
+        """Wall time taken by the pool so far, in seconds"""
+        if self.started is None:
+            return 0
+
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def cumulative(self):
+        """Time it would have taken to run all completed tasks sequentially, in seconds"""
+        return sum(t.duration for t in self.tasks if t.is_done)
+
+    @property
+    def speedup(self):
+        """How many times faster than running all tasks sequentially the pool was"""
+        elapsed = self.elapsed
+        return self.cumulative / elapsed if elapsed else 1.0
+
+    def submit(self, program, *args, **kwargs):
+        """
+        :param str program: Program to run
+        :param args: Command line args
+        :param kwargs: Keyword args for run()
+        :return RunTask: Corresponding task
+        """
+        if self.path_env is not None:
+            kwargs.setdefault("path_env", self.path_env)
+
+        task = RunTask(program, args, kwargs)
+        with self._lock:
+            if self.started is None:
+                self.started = time.time()
+
+            self.finished = None
+            self.tasks.append(task)
+            self._pending.put(task)
+            if self._workers < self.max_workers:
+                self._workers += 1
+                t = threading.Thread(target=self._work, name="RunPool-%s" % self._workers)
+                t.daemon = True
+                t.start()
+
+        return task
+
+    def as_completed(self):
+        """
+        :return: Currently submitted tasks, yielded in the order in which they complete
+        """
+        for _ in range(len(self.tasks)):
+            yield self._completed.get()
+
+    def wait(self):
+        """
+        Wait for all submitted tasks to complete, and log timing summary
+
+        :return list[RunTask]: All tasks, in submission order
+        """
+        for task in self.tasks:
+            task._done.wait()
+
+        if self.logger and self.tasks:
+            message = "Ran %s programs in %.2fs (%.2fs if ran sequentially, %.1fx speedup)" % (
+                len(self.tasks), self.elapsed, self.cumulative, self.speedup,
+            )
+            self.logger(message)
+
+        return self.tasks
+
+    def _work(self):
+        while True:
+            with self._lock:
+                try:
+                    task = self._pending.get_nowait()
+
+                except queue.Empty:
+                    self._workers -= 1
+                    return
+
+            task.execute()
+            with self._lock:
+                if self._pending.empty() and all(t.is_done for t in self.tasks):
+                    self.finished = time.time()
+
+            self._completed.put(task)
+
+
+def run_many(commands, max_workers=8, completion_order=False, **kwargs):
+    """
+    Run 'commands' concurrently, see RunPool
+
+    :param list commands: Commands to run, each command is a list with program and args, example: ["git", "fetch"]
+    :param int max_workers: Max number of programs to run concurrently
+    :param bool completion_order: If True, return outputs in the order in which commands completed (submission order otherwise)
+    :param kwargs: Keyword args passed through to run() for each command ('fatal' is respected per command)
+    :return list: What run() returned for each command
+    """
+    pool = RunPool(max_workers=max_workers, logger=kwargs.get("logger", LOG.debug))
+    for command in commands:
+        command = flattened(command, split=SHELL)
+        pool.submit(command[0], *command[1:], **kwargs)
+
+    tasks = list(pool.as_completed()) if completion_order else pool.tasks
+    result = [task.result() for task in tasks]
+    pool.wait()
+    return result
@@ -0,0 +1,150 @@
+"""
+Bulk snapshot of running processes (via /proc), complementing runez.check_pid()
+
+Usage:
+    from runez.processes import ProcessTable
+
+    alive = ProcessTable().alive(pids)
+"""
+
+import os
+import time
+
+from runez.base import decode, Slotted
+from runez.convert import represented_args
+from runez.program import _listed_names, check_pid
+
+
+class ProcessInfo(Slotted):
+    """One row of a ProcessTable"""
+
+    __slots__ = ["pid", "ppid", "state", "name", "cmdline", "rss", "started"]
+
+    def __repr__(self):
+        return "%s %s" % (self.pid, represented_args(self.cmdline) if self.cmdline else "[%s]" % self.name)
+
+    @property
+    def key(self):
+        """Identifies this process across snapshots, even if its pid gets reused later"""
+        return self.pid, self.started
+
+
+class ProcessTable(object):
+    """
+    Snapshot of all running processes, obtained by scanning /proc once
+
+    Usage:
+        table = ProcessTable()
+        alive = table.alive(pids)  # Much cheaper than calling check_pid() on each pid
+        ...
+        newer = ProcessTable()
+        started, exited = newer.diff(table)
+    """
+
+    def __init__(self, cmdline=True, proc="/proc"):
+        """
+        :param bool cmdline: If True, read command line of each process as well (one extra read per process)
+        :param str proc: Path to procfs
+        """
+        self.proc = proc
+        self.supported = os.path.isdir(proc)
+        self.processes = {}  # type: dict[int, ProcessInfo]
+        self.timestamp = time.time()
+        if self.supported:
+            boot_time = self._boot_time()
+            for name in _listed_names(proc):
+                if name.isdigit():
+                    info = self._process_info(int(name), boot_time, cmdline)
+                    if info is not None:
+                        self.processes[info.pid] = info
+
+    def __repr__(self):
+        return "%s processes" % len(self.processes)
+
+    def __contains__(self, pid):
+        return pid in self.processes
+
+    def __iter__(self):
+        return iter(self.processes.values())
+
+    def __len__(self):
+        return len(self.processes)
+
+    def get(self, pid):
+        """
+        :param int pid: Pid to look up
+        :return ProcessInfo|None: Corresponding process, if it was running at the time of the snapshot
+        """
+        return self.processes.get(pid)
+
+    def alive(self, pids):
+        """
+        :param iterable pids: Pids to examine
+        :return set: Subset of 'pids' that were running at the time of the snapshot
+        """
+        if not self.supported:  # pragma: no cover, no /proc on this platform (macos for example)
+            return set(pid for pid in pids if check_pid(pid))
+
+        return set(pid for pid in pids if pid in self.processes)
+
+    def children(self, pid):
+        """
+        :param int pid: Parent pid
+        :return list[ProcessInfo]: Direct children of 'pid'
+        """
+        return [p for p in self.processes.values() if p.ppid == pid]
+
+    def diff(self, previous):
+        """
+        :param ProcessTable previous: Earlier snapshot
+        :return (list[ProcessInfo], list[ProcessInfo]): Processes started since 'previous', and processes that exited
+        """
+        current = dict((p.key, p) for p in self.processes.values())
+        before = dict((p.key, p) for p in previous.processes.values())
+        started = [p for k, p in current.items() if k not in before]
+        exited = [p for k, p in before.items() if k not in current]
+        return sorted(started, key=lambda x: x.pid), sorted(exited, key=lambda x: x.pid)
+
+    def _boot_time(self):
+        try:
+            with open(os.path.join(self.proc, "stat")) as fh:
+                for line in fh:
+                    if line.startswith("btime"):
+                        return int(line.split()[1])
+
+        except (IOError, OSError, ValueError):  # pragma: no cover
+            pass
+
+        return 0  # pragma: no cover
+
+    def _process_info(self, pid, boot_time, cmdline):
+        """
+        :param int pid: Pid to examine
+        :param int boot_time: Epoch when system was booted
+        :param bool cmdline: If True, read command line as well
+        :return ProcessInfo|None: Corresponding info, if process still exists
+        """
+        folder = os.path.join(self.proc, str(pid))
+        try:
+            with open(os.path.join(folder, "stat"), "rb") as fh:
+                stat = decode(fh.read())
+
+            args = None
+            if cmdline:
+                with open(os.path.join(folder, "cmdline"), "rb") as fh:
+                    args = [decode(a) for a in fh.read().split(b"\0")[:-1]]
+
+        except (IOError, OSError):  # Process exited while we were scanning
+            return None
+
+        # Format is: pid (comm) state ppid ..., where 'comm' may contain spaces and parens
+        i = stat.rfind(")")
+        fields = stat[i + 2:].split()
+        info = ProcessInfo(pid=pid, name=stat[stat.find("(") + 1:i], state=fields[0], ppid=int(fields[1]), cmdline=args)
+        info.started = boot_time + float(fields[19]) / _CLOCK_TICKS
+        info.rss = int(fields[21]) * _PAGE_SIZE
+        return info
+
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
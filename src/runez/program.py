@@ -4,12 +4,28 @@ Convenience methods for executing programs
 
 import logging
 import os
+import random
+import re
+import select
+import signal
 import subprocess  # nosec
 import sys
+import tempfile
+import threading
 import time
 
-from runez.base import decode
-from runez.convert import flattened, represented_args, SHELL, short
+try:
+    import selectors
+
+except ImportError:  # pragma: no cover, python2
+    selectors = None
+
+from runez.base import decode, Slotted, string_type
+from runez.config import to_bytesize, to_int
+from runez.convert import flattened, quoted, represented_args, SHELL, short
+from runez.hooks import RunEvent, RunHooks
+from runez.path import ensure_folder
+from runez.runcache import RunCache
 from runez.system import abort, is_dryrun
 
 
@@ -97,50 +113,580 @@ def make_executable(path, fatal=True):
         return abort("Can't chmod %s: %s", short(path), e, fatal=(fatal, -1))
 
 
+def iter_run(program, *args, **kwargs):
+    """
+    Run 'program' with 'args', yielding its output line by line as it arrives (output is not accumulated in memory)
+
+    Accepts the same arguments as run(), with these differences:
+    - stderr lines are yielded as well (interleaved with stdout lines) if 'include_error' is True,
+      otherwise their tail (last 'capture_limit' bytes, 64k by default) is retained to be reported in the abort message on failure
+    - nothing is yielded in dryrun mode, or if 'program' is not installed
+    """
+    kwargs["stdout"] = subprocess.PIPE
+    kwargs["stderr"] = subprocess.PIPE
+    full_path, args, options = _run_prelude(program, args, kwargs)
+    if not full_path:
+        return
+
+    fatal = options["fatal"]
+    include_error = options["include_error"]
+    p = None
+    err = _CappedOutput(to_bytesize(kwargs.pop("capture_limit", None) or "64k"))
+    started = time.time()
+    deadline = options["timeout"] and started + options["timeout"]
+    try:
+        p = _popen(full_path, args, kwargs, spawn=options["spawn"])
+        feeder = _start_feeder(p, options["input"])
+        for stream, line in _iter_lines(p, deadline=deadline):
+            if stream is p.stdout or include_error:
+                yield line
+
+            else:
+                err.write(line.encode("utf-8") + b"\n")
+
+        rusage = _wait(p, deadline=deadline)
+        if feeder is not None:
+            feeder.join()
+
+    except _TimedOut:
+        _kill(p, options)
+        abort("%s timed out after %ss", short(program), options["timeout"], fatal=fatal)
+        return
+
+    except Exception as e:
+        abort("%s failed: %s", short(program), e, exc_info=e, fatal=fatal)
+        return
+
+    finally:
+        _close_redirects(options)
+        if p is not None and p.returncode is None:
+            # Generator was closed before child exited
+            _kill(p, options)
+
+    _report_usage(program, full_path, args, p, started, rusage, options)
+    if p.returncode and fatal is not None:
+        abort(_failure_message(program, p.returncode, None, err), fatal=fatal)
+
+
 def run(program, *args, **kwargs):
-    """Run 'program' with 'args'"""
-    args = flattened(args, split=SHELL)
-    full_path = which(program)
+    """
+    Run 'program' with 'args'
 
-    logger = kwargs.pop("logger", LOG.debug)
-    fatal = kwargs.pop("fatal", True)
-    dryrun = kwargs.pop("dryrun", is_dryrun())
-    include_error = kwargs.pop("include_error", False)
+    Output is fully captured in memory by default, this can be bounded via:
+    - capture_limit (int|str): Retain only the first and last 'capture_limit' bytes (example: "64k") of stdout and stderr
+    - spill (bool): If True, save full stdout/stderr to temp files (their path is logged, and mentioned in abort message)
 
-    message = "Would run" if dryrun else "Running"
-    message = "%s: %s %s" % (message, short(full_path or program), represented_args(args))
-    if logger:
-        logger(message)
+    'stdin', 'stdout' and 'stderr' can also be paths to files, input/output then goes straight from/to those files (not through python)
 
-    if dryrun:
-        return message
+    Other runez-specific keyword args (all other keyword args are passed through to Popen):
+    - cache (bool|RunCache): If provided, reuse output of previous identical successful run (for idempotent programs only)
+    - as_result (bool): If True, return a RunResult (with raw stdout/stderr bytes, exit code etc) instead of stripped output
+    - path_env (dict|EnvProfile): PATH-like env vars to extend (use an EnvProfile to avoid recomputing env on each run)
+    - spawn (bool): If True, launch program via os.posix_spawn() (avoids the cost of fork() for parents with a large RSS),
+      used only when no other Popen features than 'stdin', 'stdout', 'stderr' and 'env' are needed
+    - retry (int|RetryPolicy): Retry program if it fails transiently (int: max number of attempts)
+    - timeout (float): Kill program (and all processes it started) if it didn't complete after 'timeout' seconds
+    - input (bytes|str|iterable): Data to feed to program's stdin: bytes, text, or iterable of chunks
+      (fed concurrently with reading program's output, iterables are consumed once: not re-fed on retry)
+      To feed program from a file, pass its path as 'stdin' instead (file is then passed as-is to program)
+    - nice (int): Niceness increment for program
+    - ionice (str|tuple): IO scheduling class for program ("realtime", "best-effort" or "idle"), optionally with a level 0-7
+    - cpus (iterable): CPUs to pin program to (via sched_setaffinity())
+    - limits (dict): Resource limits for program: "as" (address space, example: "4g"), "cpu" (seconds), "nofile"
+      Note: 'nice', 'ionice', 'cpus' and 'limits' are applied in the child via Popen's 'preexec_fn' (between fork and exec),
+      so they're in place before program starts. 'preexec_fn' is not safe if parent has other threads that hold locks,
+      and it prevents 'spawn' from being used (program is then launched via regular fork+exec)
+    - usage (RunUsage): Filled with wall time, CPU time and max RSS of program, once it completed
+    """
+    cache = kwargs.pop("cache", None)
+    if cache is True:
+        cache = RunCache.default()
+
+    retry = kwargs.pop("retry", None)
+    if isinstance(retry, int):
+        retry = RetryPolicy(max_attempts=retry)
 
+    full_path, args, options = _run_prelude(program, args, kwargs, cache=cache)
     if not full_path:
-        return abort("%s is not installed", short(program), fatal=fatal)
+        return options["result"]
 
-    stdout = kwargs.pop("stdout", subprocess.PIPE)
-    stderr = kwargs.pop("stderr", subprocess.PIPE)
-    args = [full_path] + args
+    fatal = options["fatal"]
+    capture_limit = to_bytesize(kwargs.pop("capture_limit", None))
+    spill = kwargs.pop("spill", False)
+    kwargs.setdefault("stdout", subprocess.PIPE)
+    kwargs.setdefault("stderr", subprocess.PIPE)
+    plain = not capture_limit and not spill and not options["timeout"] and kwargs.get("stdin") != subprocess.PIPE
+    plain = plain and not options["spawn"] and options["usage"] is None and options["run_result"] is None and not RunHooks.on_finish
+    p = None
+    first_started = time.time()
+    attempt = 0
     try:
-        path_env = kwargs.pop("path_env", None)
-        if path_env:
-            kwargs["env"] = added_env_paths(path_env, env=kwargs.get("env"))
-        p = subprocess.Popen(args, stdout=stdout, stderr=stderr, **kwargs)  # nosec
-        output, err = p.communicate()
-        output = decode(output, strip=True)
-        err = decode(err, strip=True)
-
-        if p.returncode and fatal is not None:
-            note = ": %s\n%s" % (err, output) if output or err else ""
-            message = "%s exited with code %s%s" % (short(program), p.returncode, note.strip())
-            return abort(message, fatal=fatal)
-
-        if include_error and err:
-            output = "%s\n%s" % (output, err)
-        return output and output.strip()
+        while True:
+            attempt += 1
+            started = time.time()
+            deadline = options["timeout"] and started + options["timeout"]
+            p = _popen(full_path, args, kwargs, spawn=options["spawn"])
+            if plain:  # Nothing to bound, time or account for: let Popen do its thing
+                feeder = None
+                output, err = (_captured(data) for data in p.communicate())
+
+            else:
+                feeder = _start_feeder(p, options["input"])
+                output, err = _communicate(p, program, capture_limit, spill, options["logger"], deadline=deadline)
+
+            rusage = _wait(p, deadline=deadline)
+            if feeder is not None:
+                feeder.join()  # Program exited, so feeder is done (or got EPIPE), re-raises failure to iterate over 'input'
+
+            _report_usage(program, full_path, args, p, started, rusage, options, output=output, err=err)
+            delay = retry and retry.delay(attempt, first_started, p.returncode, err)
+            if delay is None:
+                break
+
+            if options["logger"]:
+                message = "%s exited with code %s (attempt %s/%s)" % (short(program), p.returncode, attempt, retry.max_attempts)
+                options["logger"]("%s, retrying in %.2fs" % (message, delay))
+
+            _rewind_redirects(options)
+            time.sleep(delay)
+
+        if options["cache_key"] and p.returncode == 0 and output is not None and err is not None:
+            if not output.omitted and not err.omitted:
+                cache.put(options["cache_key"], output.value(), err.value())
+
+        return _run_outcome(program, p.returncode, output, err, fatal, options["include_error"], result=options["run_result"])
+
+    except _TimedOut:
+        _kill(p, options)
+        return abort("%s timed out after %ss", short(program), options["timeout"], fatal=_fatal(options))
 
     except Exception as e:
-        return abort("%s failed: %s", short(program), e, exc_info=e, fatal=fatal)
+        return abort("%s failed: %s", short(program), e, exc_info=e, fatal=_fatal(options))
+
+    finally:
+        _close_redirects(options)
+
+
+def run_pipeline(*commands, **kwargs):
+    """
+    Run 'commands' with their stdout/stdin connected via pipes, like a shell would do for: cmd1 | cmd2 | cmd3
+
+    Data flows directly from one program to the next (not through python).
+    Accepts the same keyword args as run() (except 'spill' and 'usage'), output of last program is returned.
+    'stdin' applies to the first program, 'stdout' to the last one.
+
+    Pipeline fails if any program exits with a non-zero code (like with bash's 'set -o pipefail'),
+    except for programs killed by SIGPIPE because a later program exited early (as in: yes | head -1)
+    With 'as_result', a list of RunResult is returned (one per program, in order)
+
+    :param list commands: Commands to run, each command is a list with program and args, example: ["zstd", "-c"]
+    """
+    commands = [flattened(c, split=SHELL) for c in commands]
+    options = _run_options(kwargs)
+    full_paths = [which(c[0]) for c in commands]
+    results = None
+    fatal = options["fatal"]
+    if options["as_result"]:
+        results = [RunResult(c[0], fp, c[1:]) for c, fp in zip(commands, full_paths)]
+        fatal = (fatal, results)
+
+    message = "Would run" if options["dryrun"] else "Running"
+    represented = ["%s %s" % (short(fp or c[0]), represented_args(c[1:])) for c, fp in zip(commands, full_paths)]
+    message = "%s: %s%s" % (message, " | ".join(r.strip() for r in represented), _represented_redirects(kwargs))
+    if options["logger"]:
+        options["logger"](message)
+
+    if options["dryrun"]:
+        if results:
+            return _dryrun_results(results, message)
+
+        return message
+
+    for c, fp in zip(commands, full_paths):
+        if not fp:
+            return abort("%s is not installed", short(c[0]), fatal=fatal)
+
+    problem = _prepare_popen_kwargs(options, kwargs)
+    if problem:
+        return abort(problem, fatal=fatal)
+
+    return _run_pipeline(commands, full_paths, kwargs, options, results)
+
+
+def _run_pipeline(commands, full_paths, kwargs, options, results):
+    """
+    :param list commands: Commands to run
+    :param list full_paths: Full path to each command's program
+    :param dict kwargs: Keyword args to pass through to Popen
+    :param dict options: Options from _run_options()
+    :param list|None results: Results to fill and return, if run_pipeline() was called with 'as_result'
+    :return str|list|None: What run_pipeline() should return
+    """
+    fatal = (options["fatal"], results) if results else options["fatal"]
+    capture_limit = to_bytesize(kwargs.pop("capture_limit", None))
+    kwargs.setdefault("stderr", subprocess.PIPE)
+    processes = []
+    started = time.time()
+    deadline = options["timeout"] and started + options["timeout"]
+    try:
+        for c, fp in zip(commands, full_paths):
+            _start_pipeline_stage(processes, fp, c[1:], kwargs, options, last=len(processes) == len(commands) - 1)
+
+        feeder = _start_feeder(processes[0], options["input"])
+
+        captured = dict((p.stderr, _CappedOutput(capture_limit)) for p in processes if p.stderr is not None)
+        if processes[-1].stdout is not None:
+            captured[processes[-1].stdout] = _CappedOutput(capture_limit)
+
+        for stream, chunk in _iter_chunks(captured, deadline=deadline):
+            captured[stream].write(chunk)
+
+        for i, p in enumerate(processes):
+            rusage = _wait(p, deadline=deadline)
+            stage_options = dict(options, usage=None, run_result=results and results[i])
+            output, err = captured.get(p.stdout), captured.get(p.stderr)
+            _report_usage(commands[i][0], full_paths[i], commands[i][1:], p, started, rusage, stage_options, output=output, err=err)
+
+        if feeder is not None:
+            feeder.join()
+
+    except _TimedOut:
+        for p in processes:
+            _kill(p, options)
+
+        return abort("%s timed out after %ss", short(commands[0][0]), options["timeout"], fatal=fatal)
+
+    except Exception as e:
+        for p in processes:
+            _kill(p, options)
+
+        return abort("%s failed: %s", short(commands[0][0]), e, exc_info=e, fatal=fatal)
+
+    finally:
+        _close_redirects(options)
+
+    return _pipeline_outcome(commands, processes, captured, options, results)
+
+
+def _start_pipeline_stage(processes, full_path, args, kwargs, options, last):
+    """
+    :param list processes: Processes started so far in the pipeline, newly started process is appended to it
+    :param str full_path: Full path to program to run
+    :param list args: Command line args
+    :param dict kwargs: Keyword args to pass through to Popen
+    :param dict options: Options from _run_options()
+    :param bool last: True if this is the last program in the pipeline
+    """
+    if processes:
+        kwargs = dict(kwargs, stdin=processes[-1].stdout)
+
+    if not last:
+        kwargs = dict(kwargs, stdout=subprocess.PIPE)
+
+    kwargs.setdefault("stdout", subprocess.PIPE)
+    processes.append(_popen(full_path, args, kwargs, spawn=options["spawn"]))
+    if len(processes) > 1:
+        # Let only the next program hold the read end of the pipe, so that SIGPIPE propagates upstream
+        processes[-2].stdout.close()
+
+
+def _dryrun_results(results, message):
+    """
+    :param list[RunResult] results: Results to return in dryrun mode
+    :param str message: "Would run" message, reported as output of last program
+    :return list[RunResult]: 'results'
+    """
+    for r in results:
+        r.exit_code = 0
+
+    results[-1].set_output(message.encode("utf-8"), None)
+    return results
+
+
+def _pipeline_outcome(commands, processes, captured, options, results):
+    """
+    :param list commands: Commands that were ran
+    :param list processes: Corresponding processes, all exited
+    :param dict captured: Captured output, per stream
+    :param dict options: Options from _run_options()
+    :param list|None results: Results to fill and return, if run_pipeline() was called with 'as_result'
+    :return str|list|None: What run_pipeline() should return
+    """
+    output = captured.get(processes[-1].stdout)
+    for i, p in enumerate(processes):
+        err = captured.get(p.stderr)
+        last = i == len(processes) - 1
+        if results:
+            results[i].exit_code = p.returncode
+            results[i].set_output(output if last else None, err)
+
+        if p.returncode and (last or p.returncode != -signal.SIGPIPE) and options["fatal"] is not None:
+            message = _failure_message(commands[i][0], p.returncode, output if last else None, err)
+            return abort(message, fatal=(options["fatal"], results) if results else options["fatal"])
+
+    if results:
+        return results
+
+    output = _text(output)
+    if options["include_error"]:
+        errors = [_text(captured.get(p.stderr)) for p in processes]
+        output = "\n".join(x for x in [output] + errors if x)
+
+    return output
+
+
+class RetryPolicy(object):
+    """
+    How run() should retry programs that fail transiently (such as downloads, or remote git fetches)
+
+    Delay between attempts grows exponentially, with "full jitter" (random delay between 0 and the exponential value).
+    By default, any non-zero exit code is considered retryable, this can be narrowed down via 'exit_codes' and/or 'patterns'
+    """
+
+    def __init__(self, max_attempts=3, exit_codes=None, patterns=None, base_delay=0.5, max_delay=30, deadline=None):
+        """
+        :param int max_attempts: Max number of times to run the program
+        :param list|None exit_codes: Exit codes considered retryable
+        :param list|None patterns: Regexes that, when found in stderr, make a failure retryable
+        :param float base_delay: Max delay before 2nd attempt, in seconds (doubled on each subsequent attempt)
+        :param float max_delay: Max delay between attempts, in seconds
+        :param float|None deadline: Don't start a new attempt if it would start after 'deadline' seconds since 1st attempt
+        """
+        self.max_attempts = max_attempts
+        self.exit_codes = exit_codes
+        self.patterns = [re.compile(p) if isinstance(p, string_type) else p for p in patterns or ()]
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def __repr__(self):
+        return "%s attempts" % self.max_attempts
+
+    def is_retryable(self, returncode, err):
+        """
+        :param int returncode: Exit code of failed program
+        :param _CappedOutput|str|None err: Captured stderr
+        :return bool: True if failure is considered transient
+        """
+        if not self.exit_codes and not self.patterns:
+            return True
+
+        if self.exit_codes and returncode in self.exit_codes:
+            return True
+
+        err = _text(err)
+        return bool(err) and any(p.search(err) for p in self.patterns)
+
+    def delay(self, attempt, started, returncode, err):
+        """
+        :param int attempt: Number of attempts made so far
+        :param float started: Epoch when first attempt was started
+        :param int returncode: Exit code of last attempt
+        :param _CappedOutput|str|None err: Captured stderr of last attempt
+        :return float|None: How long to wait before next attempt, None if no new attempt should be made
+        """
+        if not returncode or attempt >= self.max_attempts or not self.is_retryable(returncode, err):
+            return None
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))  # nosec, not used for crypto
+        if self.deadline is not None and time.time() + delay - started > self.deadline:
+            return None
+
+        return delay
+
+
+class RunUsage(Slotted):
+    """Resources used by a program ran via run()"""
+
+    __slots__ = ["wall_time", "user_time", "system_time", "max_rss"]
+
+    def __repr__(self):
+        text = "%.3fs wall" % (self.wall_time or 0)
+        if self.user_time is not None:
+            text += ", %.3fs user, %.3fs sys" % (self.user_time, self.system_time)
+
+        if self.max_rss:
+            text += ", %.1f MB max RSS" % (float(self.max_rss) / 1024 / 1024)
+
+        return text
+
+    def set_rusage(self, rusage):
+        """
+        :param resource.struct_rusage|None rusage: Resource usage, as reported by os.wait4()
+        """
+        if rusage is not None:
+            self.user_time = rusage.ru_utime
+            self.system_time = rusage.ru_stime
+            self.max_rss = rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)  # Reported in KB on linux
+
+
+class RunResult(object):
+    """
+    Outcome of a run(..., as_result=True)
+
+    Output is kept as raw bytes, and decoded only when asked for (via 'output' and 'error')
+    """
+
+    def __init__(self, program, full_path=None, args=None):
+        """
+        :param str program: Program that was ran
+        :param str|None full_path: Full path to program
+        :param list|None args: Command line args
+        """
+        self.program = program
+        self.full_path = full_path
+        self.args = args
+        self.exit_code = None  # None if program could not be ran
+        self.stdout = None  # type: bytes # Captured stdout (None if not captured)
+        self.stderr = None  # type: bytes # Captured stderr (None if not captured)
+        self.usage = None  # type: RunUsage
+        self._decoded = {}
+
+    def __repr__(self):
+        return "%s %s: exit code %s" % (short(self.full_path or self.program), represented_args(self.args), self.exit_code)
+
+    def __str__(self):
+        return self.output or ""
+
+    @property
+    def succeeded(self):
+        return self.exit_code == 0
+
+    @property
+    def output(self):
+        """Decoded stdout, stripped"""
+        return self._decode("stdout")
+
+    @property
+    def error(self):
+        """Decoded stderr, stripped"""
+        return self._decode("stderr")
+
+    def _decode(self, name):
+        if name not in self._decoded:
+            self._decoded[name] = decode(getattr(self, name), strip=True)
+
+        return self._decoded[name]
+
+    def set_output(self, stdout, stderr):
+        """
+        :param _CappedOutput|bytes|None stdout: Captured stdout
+        :param _CappedOutput|bytes|None stderr: Captured stderr
+        """
+        self.stdout = stdout.value() if isinstance(stdout, _CappedOutput) else stdout
+        self.stderr = stderr.value() if isinstance(stderr, _CappedOutput) else stderr
+        self._decoded = {}
+
+
+class PathIndex(object):
+    """
+    Index of executables found in PATH, allows which() to not probe every PATH entry on each call
+
+    Folders are listed lazily (via os.scandir) the first time a lookup needs them.
+    Lookups cost one stat() per folder: a folder is listed again when its mtime changes, or when PATH changes.
+    Call refresh() to force a full re-index
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._folders = []  # type: list[_IndexedFolder]
+
+    def __repr__(self):
+        return "%s folders" % len(self._folders)
+
+    def refresh(self):
+        """Forget everything that was indexed so far"""
+        with self._lock:
+            self._path = None
+            self._folders = []
+
+    def which(self, program, ignore_own_venv=False):
+        """
+        :param str program: Basename of program to find via env var PATH
+        :param bool ignore_own_venv: If True, do not resolve to executables in current venv
+        :return str|None: Full path to program, if one exists and is executable
+        """
+        path = os.environ.get("PATH", "")
+        with self._lock:
+            if path != self._path:
+                self._path = path
+                self._folders = [_IndexedFolder(p) for p in path.split(":")]
+
+            for folder in self._folders:
+                fp = folder.executable(program)
+                if fp and (not ignore_own_venv or not fp.startswith(sys.prefix)):
+                    return fp
+
+        return None
+
+
+class _IndexedFolder(object):
+    """Cached listing of one PATH entry"""
+
+    def __init__(self, path):
+        """
+        :param str path: Folder from PATH
+        """
+        self.path = path
+        self.mtime = None
+        self.names = None  # type: set # Names of files in this folder, as of 'mtime'
+        self.executables = {}  # type: dict # Executables seen so far in this folder: basename -> full path
+
+    def __repr__(self):
+        return self.path
+
+    def executable(self, name):
+        """
+        :param str name: Basename of program
+        :return str|None: Full path to 'name', if it exists in this folder and is executable
+        """
+        if not os.path.isabs(self.path):
+            # Empty or relative PATH entries are relative to current working dir, which can change: don't cache anything for them
+            fp = os.path.join(self.path, name)
+            return fp if is_executable(fp) else None
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+
+        except OSError:
+            mtime = None
+
+        if self.names is None or mtime != self.mtime:
+            self.mtime = mtime
+            self.names = _listed_names(self.path) if mtime is not None else set()
+            self.executables = {}
+
+        if name not in self.names:
+            return None
+
+        fp = self.executables.get(name)
+        if fp is None:
+            fp = os.path.join(self.path, name)
+            if not is_executable(fp):
+                return None  # Not cached, file could be chmod-ed later (which doesn't change folder's mtime)
+
+            self.executables[name] = fp
+
+        return fp
+
+
+def _listed_names(folder):
+    """
+    :param str folder: Folder to list
+    :return set: Names of files in 'folder' (empty if folder can't be listed)
+    """
+    try:
+        if hasattr(os, "scandir"):
+            return set(entry.name for entry in os.scandir(folder))
+
+        return set(os.listdir(folder))  # pragma: no cover, python2
+
+    except OSError:
+        return set()
+
+
+PATH_INDEX = PathIndex()
 
 
 def which(program, ignore_own_venv=False):
@@ -153,6 +699,8 @@ def which(program, ignore_own_venv=False):
         return None
     if os.path.isabs(program):
         return program if is_executable(program) else None
+    if os.path.sep not in program:
+        return PATH_INDEX.which(program, ignore_own_venv=ignore_own_venv)
     for p in os.environ.get("PATH", "").split(":"):
         fp = os.path.join(p, program)
         if (not ignore_own_venv or not fp.startswith(sys.prefix)) and is_executable(fp):
@@ -169,7 +717,7 @@ def added_env_paths(env_vars, env=None):
         return None
 
     if not env:
-        env = dict(os.environ)
+        env = os.environ
 
     result = dict(env)
     for env_var, paths in env_vars.items():
@@ -188,3 +736,928 @@ def added_env_paths(env_vars, env=None):
             result[env_var] = separator.join(current)
 
     return result
+
+
+class EnvProfile(object):
+    """
+    Environment to run programs with, computed once and reused across run() calls (recomputed if os.environ changes)
+
+    Usage:
+        profile = EnvProfile(path_env={"PATH": ":/opt/tools/bin"}, overrides={"LC_ALL": "C"})
+        for path in paths:
+            run("some-tool", path, path_env=profile)
+    """
+
+    def __init__(self, path_env=None, overrides=None):
+        """
+        :param dict|None path_env: PATH-like env vars to extend, same format as 'path_env' in run(), example: {"PATH": ":/usr/local/bin"}
+        :param dict|None overrides: Env vars to set (or remove, when value is None)
+        """
+        self.path_env = path_env
+        self.overrides = overrides
+        self.computed = 0  # Number of times env was (re)computed
+        self._env = None
+        self._source = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "EnvProfile(%s)" % ", ".join(sorted(self.path_env or []) + sorted(self.overrides or []))
+
+    @property
+    def key(self):
+        """Deterministic representation of this profile, suitable for cache keys"""
+        return sorted((self.path_env or {}).items()), sorted((self.overrides or {}).items(), key=lambda x: x[0])
+
+    @property
+    def env(self):
+        """
+        :return dict: Merged env vars (must not be modified by caller)
+        """
+        source = _environ_data()
+        with self._lock:
+            if self._env is None or source != self._source:
+                self._source = dict(source)
+                self._env = self.merged(os.environ)
+                self.computed += 1
+
+            return self._env
+
+    def merged(self, env):
+        """
+        :param dict env: Env vars to apply this profile to
+        :return dict: New dict with 'env' customized as per this profile
+        """
+        result = added_env_paths(self.path_env, env=env) or dict(env)
+        if self.overrides:
+            for key, value in self.overrides.items():
+                if value is None:
+                    result.pop(key, None)
+
+                else:
+                    result[key] = value
+
+        return result
+
+
+def _environ_data():
+    """
+    :return dict: Raw data backing os.environ, cheap to compare (avoids decoding all keys and values)
+    """
+    data = getattr(os.environ, "_data", None)
+    if data is None:  # pragma: no cover, python2
+        data = getattr(os.environ, "data", os.environ)
+
+    return data
+
+
+def _run_prelude(program, args, kwargs, cache=None):
+    """
+    Common part of run() and iter_run(): resolve 'program', log what's about to be run, and handle dryrun mode
+
+    :param str program: Program to run
+    :param tuple args: Command line args (flattened here)
+    :param dict kwargs: Keyword args given to run(), runez-specific ones are popped, the rest are meant for Popen
+    :param RunCache|None cache: Cache to consult (and fill) for program's output
+    :return (str|None, list, dict): Full path to program (None if it shouldn't be run), flattened args, and runez options
+    """
+    args = flattened(args, split=SHELL)
+    full_path = which(program)
+    options = _run_options(kwargs)
+    if options["as_result"]:
+        options["run_result"] = RunResult(program, full_path, args)
+
+    cached = None
+    if cache is not None and full_path and not options["dryrun"]:
+        options["cache_key"] = cache.key(full_path, args, kwargs, options["path_env"])
+        cached = options["cache_key"] and cache.get(options["cache_key"])
+
+    message = "Would run" if options["dryrun"] else "Reusing cached output of" if cached else "Running"
+    message = "%s: %s %s%s" % (message, short(full_path or program), represented_args(args), _represented_redirects(kwargs))
+    if options["logger"]:
+        options["logger"](message)
+
+    if cached:
+        stdout, stderr = cached
+        options["result"] = _run_outcome(program, 0, stdout, stderr, options["fatal"], options["include_error"], options["run_result"])
+        return None, args, options
+
+    if options["dryrun"]:
+        options["result"] = message
+        if options["run_result"] is not None:
+            options["run_result"].exit_code = 0
+            options["run_result"].set_output(message.encode("utf-8"), None)
+            options["result"] = options["run_result"]
+
+        return None, args, options
+
+    if not full_path:
+        options["result"] = abort("%s is not installed", short(program), fatal=_fatal(options))
+        return None, args, options
+
+    problem = _prepare_popen_kwargs(options, kwargs)
+    if problem:
+        options["result"] = abort(problem, fatal=_fatal(options))
+        return None, args, options
+
+    return full_path, args, options
+
+
+def _run_options(kwargs):
+    """
+    :param dict kwargs: Keyword args given to run(), runez-specific ones are popped, the rest are meant for Popen
+    :return dict: runez-specific options
+    """
+    return dict(
+        logger=kwargs.pop("logger", LOG.debug),
+        fatal=kwargs.pop("fatal", True),
+        dryrun=kwargs.pop("dryrun", is_dryrun()),
+        include_error=kwargs.pop("include_error", False),
+        path_env=kwargs.pop("path_env", None),
+        timeout=kwargs.pop("timeout", None),
+        usage=kwargs.pop("usage", None),
+        as_result=kwargs.pop("as_result", False),
+        run_result=None,
+        redirects=[],
+        spawn=kwargs.pop("spawn", False),
+        cache_key=None,
+        nice=kwargs.pop("nice", None),
+        ionice=kwargs.pop("ionice", None),
+        cpus=kwargs.pop("cpus", None),
+        limits=kwargs.pop("limits", None),
+        input=_input_option(kwargs),
+    )
+
+
+def _input_option(kwargs):
+    """
+    :param dict kwargs: Keyword args given to run(), 'input' is popped, and 'stdin' set accordingly
+    :return bytes|iterable|None: Data to feed to program's stdin from python (None if there is none)
+    """
+    data = kwargs.pop("input", None)
+    if data is None:
+        return None
+
+    if isinstance(data, string_type) and not isinstance(data, bytes):
+        data = data.encode("utf-8")  # Text is data (like subprocess.run()), use 'stdin' to feed program from a file
+
+    kwargs["stdin"] = subprocess.PIPE
+    return data
+
+
+def _represented_redirects(kwargs):
+    """
+    :param dict kwargs: Keyword args to pass through to Popen
+    :return str: Shell-like representation of 'stdout'/'stderr' redirected to files, if any
+    """
+    result = ""
+    for name, marker in (("stdin", "<"), ("stdout", ">"), ("stderr", "2>")):
+        path = kwargs.get(name)
+        if isinstance(path, string_type):
+            result += " %s %s" % (marker, quoted(short(path)))
+
+    return result
+
+
+def _open_redirects(options, kwargs):
+    """
+    Open files for 'stdin'/'stdout'/'stderr' given as paths, program's input/output then goes straight to/from those files
+
+    :param dict options: Options from _run_options()
+    :param dict kwargs: Keyword args to pass through to Popen, paths are replaced by file descriptors
+    :return str|None: Problem preventing program from running, if any
+    """
+    path = kwargs.get("stdin")
+    if isinstance(path, string_type):
+        try:
+            kwargs["stdin"] = os.open(path, os.O_RDONLY)
+            options["redirects"].append(("stdin", path, kwargs["stdin"]))
+
+        except Exception as e:
+            return "Can't read %s: %s" % (short(path), e)
+
+    for name in ("stdout", "stderr"):
+        path = kwargs.get(name)
+        if isinstance(path, string_type):
+            if any(n == "stdout" and p == path for n, p, _ in options["redirects"]):
+                kwargs[name] = subprocess.STDOUT  # stderr redirected to same file as stdout
+                continue
+
+            try:
+                ensure_folder(path, fatal=False, logger=None)
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                kwargs[name] = fd
+                options["redirects"].append((name, path, fd))
+
+            except Exception as e:
+                _close_redirects(options)
+                return "Can't write to %s: %s" % (short(path), e)
+
+    return None
+
+
+def _rewind_redirects(options):
+    """
+    :param dict options: Options from _run_options()
+    """
+    for name, _, fd in options["redirects"]:
+        if fd is not None:
+            if name != "stdin":
+                os.ftruncate(fd, 0)
+
+            os.lseek(fd, 0, os.SEEK_SET)
+
+
+def _close_redirects(options):
+    """
+    :param dict options: Options from _run_options()
+    """
+    for _, _, fd in options["redirects"]:
+        if fd is not None:
+            os.close(fd)
+
+    options["redirects"] = [(name, path, None) for name, path, _ in options["redirects"]]
+
+
+def _prepare_popen_kwargs(options, kwargs):
+    """
+    :param dict options: Options from _run_options()
+    :param dict kwargs: Keyword args to pass through to Popen
+    :return str|None: Problem preventing program from running, if any
+    """
+    problem = _open_redirects(options, kwargs)
+    if problem:
+        return problem
+
+    path_env = options["path_env"]
+    if isinstance(path_env, EnvProfile):
+        kwargs["env"] = path_env.merged(kwargs["env"]) if kwargs.get("env") else path_env.env
+
+    elif path_env:
+        kwargs["env"] = added_env_paths(path_env, env=kwargs.get("env"))
+
+    if options["timeout"]:
+        # Run in its own process group, so that we can kill the program along with all the processes it started
+        if sys.version_info[0] >= 3:
+            kwargs.setdefault("start_new_session", True)
+
+        else:  # pragma: no cover, python2
+            kwargs.setdefault("preexec_fn", os.setsid)
+
+    try:
+        setup = _child_setup(options)
+
+    except Exception as e:
+        _close_redirects(options)
+        return str(e)
+
+    if setup:
+        previous = kwargs.get("preexec_fn")
+        if previous is not None:
+            setup.insert(0, previous)
+
+        kwargs["preexec_fn"] = lambda: [f() for f in setup]
+
+
+IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+RLIMITS = {"as": "RLIMIT_AS", "cpu": "RLIMIT_CPU", "nofile": "RLIMIT_NOFILE"}
+_IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273, "s390x": 282}
+
+
+def _child_setup(options):
+    """
+    Validate 'nice', 'ionice', 'cpus' and 'limits' options upfront (so that problems are reported via abort()),
+    and return functions applying them in the child process (between fork and exec, via 'preexec_fn').
+    They are not applied from the parent after launch, as program could then run (or even complete) before they take effect.
+
+    :param dict options: Options from _run_options()
+    :return list|None: Functions to call in child process, if any
+    """
+    setup = []
+    nice = options["nice"]
+    if nice is not None:
+        if not hasattr(os, "nice"):  # pragma: no cover
+            raise Exception("'nice' is not supported on this platform")
+
+        setup.append(lambda: os.nice(int(nice)))
+
+    if options["ionice"] is not None:
+        setup.append(_ioprio_setter(options["ionice"]))
+
+    cpus = options["cpus"]
+    if cpus is not None:
+        if not hasattr(os, "sched_setaffinity"):  # pragma: no cover, macos
+            raise Exception("'cpus' is not supported on this platform")
+
+        cpus = set(cpus)
+        unknown = cpus - os.sched_getaffinity(0)
+        if not cpus or unknown:
+            raise Exception("Invalid cpus %s (available: %s)" % (sorted(unknown or cpus), sorted(os.sched_getaffinity(0))))
+
+        setup.append(lambda: os.sched_setaffinity(0, cpus))
+
+    if options["limits"]:
+        import resource
+
+        limits = []
+        for name, value in options["limits"].items():
+            rlimit = getattr(resource, RLIMITS.get(name, ""), None)
+            if rlimit is None:
+                raise Exception("Unknown limit '%s', supported: %s" % (name, ", ".join(sorted(RLIMITS))))
+
+            value = to_bytesize(value) if name == "as" else to_int(value)
+            hard = resource.getrlimit(rlimit)[1]
+            if value is None or value < 0 or (hard != resource.RLIM_INFINITY and value > hard):
+                raise Exception("Invalid limit %s=%s (max: %s)" % (name, options["limits"][name], hard))
+
+            limits.append((rlimit, value))
+
+        setup.append(lambda: [resource.setrlimit(r, (v, v)) for r, v in limits])
+
+    return setup or None
+
+
+def _ioprio_setter(ionice):
+    """
+    :param str|tuple ionice: IO scheduling class ("realtime", "best-effort" or "idle"), optionally with a level (0-7)
+    :return callable: Function setting IO priority of current process (via ioprio_set() syscall, linux only)
+    """
+    cls, level = (ionice, 4) if isinstance(ionice, string_type) else ionice
+    if cls not in IOPRIO_CLASSES or not 0 <= level <= 7:
+        raise Exception("Invalid ionice %s, expecting one of: %s (with a level 0-7)" % (ionice, ", ".join(sorted(IOPRIO_CLASSES))))
+
+    import ctypes
+    import platform
+
+    syscall_number = _IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if not sys.platform.startswith("linux") or not syscall_number:
+        raise Exception("'ionice' is not supported on this platform")
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    ioprio = (IOPRIO_CLASSES[cls] << 13) | (0 if cls == "idle" else level)
+
+    def setter():
+        if libc.syscall(syscall_number, 1, 0, ioprio) != 0:  # 1: IOPRIO_WHO_PROCESS, 0: current process
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    return setter
+
+
+def _fatal(options):
+    """
+    :param dict options: Options from _run_prelude()
+    :return: 'fatal' argument to pass to abort(), so that run() returns a RunResult on failure when 'as_result' was used
+    """
+    if options["run_result"] is not None:
+        return options["fatal"], options["run_result"]
+
+    return options["fatal"]
+
+
+SPAWN_SUPPORTED_KWARGS = {"stdin", "stdout", "stderr", "env", "start_new_session"}
+
+
+def _popen(full_path, args, kwargs, spawn=False):
+    """
+    :param str full_path: Full path to program to run
+    :param list args: Command line args
+    :param dict kwargs: Keyword args to pass through to Popen
+    :param bool spawn: If True, use os.posix_spawn() when possible
+    :return subprocess.Popen|_SpawnedProcess: Started process
+    """
+    if spawn and hasattr(os, "posix_spawn") and SPAWN_SUPPORTED_KWARGS.issuperset(kwargs):
+        p = _SpawnedProcess([full_path] + args, **kwargs)
+
+    else:
+        p = subprocess.Popen([full_path] + args, **kwargs)  # nosec
+
+    if RunHooks.on_start:
+        RunHooks.fire(RunHooks.on_start, RunEvent(program=full_path, args=args, pid=p.pid))
+
+    return p
+
+
+class _SpawnedProcess(object):
+    """Minimal subprocess.Popen look-alike, for processes launched via os.posix_spawn()"""
+
+    def __init__(self, args, stdin=None, stdout=None, stderr=None, env=None, start_new_session=False):
+        self.args = args
+        self.returncode = None
+        self.stdin = self.stdout = self.stderr = None
+        file_actions = []
+        child_fds = []  # Child's ends of pipes (and /dev/null), closed in parent once child is spawned
+        targets = {}
+        try:
+            for fd, name, spec in ((0, "stdin", stdin), (1, "stdout", stdout), (2, "stderr", stderr)):
+                if spec is None:
+                    continue
+
+                if spec == subprocess.PIPE:
+                    r, w = os.pipe()
+                    parent_fd, child_fd = (w, r) if fd == 0 else (r, w)
+                    setattr(self, name, os.fdopen(parent_fd, "wb" if fd == 0 else "rb"))
+                    child_fds.append(child_fd)
+
+                elif spec == subprocess.STDOUT:
+                    child_fd = targets.get(1, 1)
+
+                elif spec == getattr(subprocess, "DEVNULL", None):
+                    child_fd = os.open(os.devnull, os.O_RDWR)
+                    child_fds.append(child_fd)
+
+                else:
+                    child_fd = spec if isinstance(spec, int) else spec.fileno()
+
+                targets[fd] = child_fd
+                file_actions.append((os.POSIX_SPAWN_DUP2, child_fd, fd))
+
+            extra = {"setpgroup": 0} if start_new_session else {}
+            # Like Popen's 'restore_signals': python ignores SIGPIPE and SIGXFSZ, child should get default handlers back
+            extra["setsigdef"] = [getattr(signal, n) for n in ("SIGPIPE", "SIGXFSZ") if hasattr(signal, n)]
+            env = os.environ if env is None else env
+            self.pid = os.posix_spawn(args[0], args, env, file_actions=file_actions, **extra)
+
+        except Exception:
+            for f in (self.stdin, self.stdout, self.stderr):
+                if f is not None:
+                    f.close()
+
+            raise
+
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+
+    def poll(self):
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                _set_returncode(self, status)
+
+        return self.returncode
+
+    def wait(self):
+        if self.returncode is None:
+            _, status = os.waitpid(self.pid, 0)
+            _set_returncode(self, status)
+
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None:
+            os.kill(self.pid, signal.SIGKILL)
+
+
+def _set_returncode(p, status):
+    """
+    :param subprocess.Popen|_SpawnedProcess p: Process that exited
+    :param int status: Exit status, as reported by os.waitpid()
+    """
+    if os.WIFSIGNALED(status):
+        p.returncode = -os.WTERMSIG(status)
+
+    else:
+        p.returncode = os.WEXITSTATUS(status)
+
+
+class _CappedOutput(object):
+    """Bounded capture of an output stream: only the first and last 'limit' bytes are retained in memory"""
+
+    def __init__(self, limit=None, spill=None):
+        """
+        :param int|None limit: Max number of bytes to retain for head and tail (no limit if None)
+        :param str|None spill: Optional suffix of temp file where to save full output
+        """
+        self.limit = limit
+        self.size = 0
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.spill_path = None
+        self._chunks = None if limit else []  # Without limit, chunks are joined only once, when value() is called
+        self._spill_fd = None
+        if spill:
+            self._spill_fd, self.spill_path = tempfile.mkstemp(prefix="runez-", suffix=spill)
+
+    def __str__(self):
+        return self.text()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def omitted(self):
+        """Number of bytes that were not retained in memory"""
+        if self._chunks is not None:
+            return 0
+
+        return self.size - len(self.head) - len(self.tail)
+
+    def write(self, chunk):
+        """
+        :param bytes chunk: Chunk of output to capture
+        """
+        self.size += len(chunk)
+        if self._spill_fd is not None:
+            os.write(self._spill_fd, chunk)
+
+        if self._chunks is not None:
+            self._chunks.append(chunk)
+            return
+
+        room = self.limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+
+        if chunk:
+            self.tail += chunk
+            excess = len(self.tail) - self.limit
+            if excess > 0:
+                del self.tail[:excess]
+
+    def close(self):
+        if self._spill_fd is not None:
+            os.close(self._spill_fd)
+            self._spill_fd = None
+
+    def value(self):
+        """
+        :return bytes: Retained output (with a marker stating how many bytes were omitted, if any)
+        """
+        if self._chunks is not None:
+            if len(self._chunks) != 1:
+                self._chunks = [b"".join(self._chunks)]
+
+            return self._chunks[0]
+
+        if self.omitted:
+            return b"%s\n... [%d bytes omitted] ...\n%s" % (self.head, self.omitted, self.tail)
+
+        return bytes(self.head + self.tail)
+
+    def text(self, tail_only=False):
+        """
+        :param bool tail_only: If True, return only the retained tail (as is done for abort messages)
+        :return str: Decoded retained output
+        """
+        if tail_only and self.tail:
+            tail = self.tail.decode("utf-8", "replace")
+            if self.omitted or self.head:
+                tail = "...%s" % tail
+
+            return tail.strip()
+
+        return self.value().decode("utf-8", "replace").strip()
+
+
+def _run_outcome(program, returncode, output, err, fatal, include_error, result=None):
+    """
+    :param str program: Program that was ran
+    :param int returncode: Exit code of program
+    :param _CappedOutput|str|None output: Captured stdout
+    :param _CappedOutput|str|None err: Captured stderr
+    :param bool|None fatal: Abort execution on failure if True
+    :param bool include_error: If True, include stderr in returned output
+    :param RunResult|None result: Result to fill and return, if run() was called with 'as_result'
+    :return str|RunResult|None: What run() should return
+    """
+    if result is not None:
+        result.exit_code = returncode
+        result.set_output(output, err)
+
+    if returncode and fatal is not None:
+        return abort(_failure_message(program, returncode, output, err), fatal=(fatal, result if result is not None else fatal))
+
+    if result is not None:
+        return result
+
+    output = _text(output)
+    err = _text(err)
+    if include_error and err:
+        output = "%s\n%s" % (output, err) if output else err
+
+    return output and output.strip()
+
+
+def _failure_message(program, returncode, output, err):
+    """
+    :param str program: Program that was ran
+    :param int returncode: Exit code of program
+    :param _CappedOutput|bytes|str|None output: Captured stdout
+    :param _CappedOutput|bytes|str|None err: Captured stderr
+    :return str: Message explaining why program failed
+    """
+    note = ": %s\n%s" % (_tail(err) or "", _tail(output) or "") if output or err else ""
+    return "%s exited with code %s%s" % (short(program), returncode, note.strip())
+
+
+def _communicate(p, program, capture_limit, spill, logger, deadline=None):
+    """
+    Like p.communicate(), but with optionally bounded memory usage and timeout (and without waiting for 'p' to exit)
+
+    :param subprocess.Popen p: Process to read output from
+    :param str program: Program being run (for logging purposes)
+    :param int|None capture_limit: Max number of bytes to retain for head and tail of each stream
+    :param bool spill: If True, save full stdout/stderr to temp files
+    :param callable|None logger: Logger to use
+    :param float|None deadline: Epoch after which to give up (raises _TimedOut)
+    :return (_CappedOutput|None, _CappedOutput|None): Captured stdout and stderr
+    """
+    captured = {}
+    for stream in (p.stdout, p.stderr):
+        if stream is not None:
+            suffix = spill and (".stdout" if stream is p.stdout else ".stderr")
+            captured[stream] = _CappedOutput(capture_limit, spill=suffix)
+
+    try:
+        for stream, chunk in _iter_chunks(captured, deadline=deadline):
+            captured[stream].write(chunk)
+
+    finally:
+        for c in captured.values():
+            c.close()
+            if c.spill_path and logger:
+                logger("Full %s of %s saved in %s" % (c.spill_path.rpartition(".")[2], short(program), c.spill_path))
+
+    return captured.get(p.stdout), captured.get(p.stderr)
+
+
+def _captured(data):
+    """
+    :param bytes|None data: Output as returned by Popen.communicate()
+    :return _CappedOutput|None: Same output, as a _CappedOutput (so that it can be handled like the output from _communicate())
+    """
+    if data is None:
+        return None
+
+    captured = _CappedOutput()
+    captured.write(data)
+    return captured
+
+
+def _start_feeder(p, data):
+    """
+    :param subprocess.Popen p: Process to feed
+    :param bytes|iterable|None data: Data to write to p.stdin (bytes, or iterable of bytes/str chunks)
+    :return _Feeder|None: Feeder writing 'data' to p.stdin, if any
+    """
+    if p.stdin is None:
+        return None
+
+    if data is None:
+        p.stdin.close()
+        return None
+
+    return _Feeder(p, data)
+
+
+class _Feeder(object):
+    """
+    Program's stdin is fed from a background thread, so that reading its output can't deadlock (and 'data' is not materialized)
+    Thread exits on its own once all 'data' is written, or once program exits (or is killed).
+    Program's stdin is always closed by the thread, even if iterating over 'data' fails (program would otherwise wait forever)
+    """
+
+    def __init__(self, p, data):
+        """
+        :param subprocess.Popen p: Process to feed
+        :param bytes|iterable data: Data to write to p.stdin
+        """
+        self.exception = None  # Exception raised while iterating over 'data', if any
+        self._thread = threading.Thread(target=self._feed, args=(p.stdin, data), name="runez-feeder-%s" % p.pid)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self):
+        """Wait for feeder to complete, re-raise exception raised while iterating over 'data', if any"""
+        self._thread.join()
+        if self.exception is not None:
+            raise self.exception
+
+    def _feed(self, stdin, data):
+        try:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                data = [data]
+
+            for chunk in data:
+                if not isinstance(chunk, (bytes, bytearray, memoryview)):
+                    chunk = chunk.encode("utf-8")
+
+                try:
+                    stdin.write(chunk)
+
+                except (IOError, OSError, ValueError):  # Program exited (or was killed) without consuming all its input
+                    return
+
+        except Exception as e:
+            self.exception = e
+
+        finally:
+            try:
+                stdin.close()
+
+            except (IOError, OSError, ValueError):
+                pass
+
+
+class _TimedOut(Exception):
+    """Raised internally when a program did not complete within its allotted time"""
+
+
+def _wait(p, deadline=None):
+    """
+    Wait for 'p' to exit, via os.wait4() in order to get its resource usage
+
+    :param subprocess.Popen p: Process to wait for
+    :param float|None deadline: Epoch after which to give up (raises _TimedOut)
+    :return resource.struct_rusage|None: Resource usage of 'p', if available
+    """
+    if p.returncode is not None:  # Already reaped (by Popen.communicate() for example), resource usage is not available
+        return None
+
+    delay = 0.0005
+    while True:
+        try:
+            pid, status, rusage = os.wait4(p.pid, os.WNOHANG if deadline else 0)
+
+        except OSError:  # Already reaped by someone else
+            p.wait()
+            return None
+
+        if pid:
+            _set_returncode(p, status)
+            return rusage
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise _TimedOut()
+
+        delay = min(delay * 2, remaining, 0.05)
+        time.sleep(delay)
+
+
+def _kill(p, options):
+    """
+    :param subprocess.Popen|None p: Process to kill (along with its process group, if it was started with a 'timeout')
+    :param dict options: Options from _run_prelude()
+    """
+    if p is not None and p.returncode is None:
+        try:
+            if options["timeout"]:
+                os.killpg(p.pid, signal.SIGKILL)
+
+            else:
+                p.kill()
+
+        except OSError:  # pragma: no cover, process already exited
+            pass
+
+        p.wait()
+
+
+def _report_usage(program, full_path, args, p, started, rusage, options, ended=None, output=None, err=None):
+    """
+    :param str program: Program that was ran
+    :param str full_path: Full path to 'program'
+    :param list args: Arguments 'program' was ran with
+    :param subprocess.Popen p: Process that exited
+    :param float started: Epoch when program was started
+    :param resource.struct_rusage|None rusage: Resource usage, as reported by os.wait4()
+    :param dict options: Options from _run_prelude()
+    :param float|None ended: Epoch when program exited (default: now)
+    :param _CappedOutput|bytes|None output: Captured stdout, if any
+    :param _CappedOutput|bytes|None err: Captured stderr, if any
+    """
+    usage = options["usage"]
+    if usage is None:
+        usage = RunUsage()
+
+    usage.wall_time = (ended or time.time()) - started
+    usage.set_rusage(rusage)
+    if options["run_result"] is not None:
+        options["run_result"].usage = usage
+
+    if RunHooks.on_finish:
+        event = RunEvent(program=full_path, args=args, pid=p.pid, exit_code=p.returncode, usage=usage)
+        event.output_size = None if output is None else len(output)
+        event.error_size = None if err is None else len(err)
+        RunHooks.fire(RunHooks.on_finish, event)
+
+    if options["logger"]:
+        options["logger"]("Ran %s: exit code %s, %s" % (short(program), p.returncode, usage))
+        for name, path, _ in options["redirects"]:
+            if name != "stdin" and os.path.isfile(path):
+                options["logger"]("Wrote %s bytes to %s" % (os.path.getsize(path), short(path)))
+
+
+def _tail(output):
+    """
+    :param _CappedOutput|bytes|str|None output: Captured output
+    :return str|None: Tail of output, as should be shown in an abort message
+    """
+    if isinstance(output, _CappedOutput):
+        text = output.text(tail_only=True)
+        if output.spill_path:
+            text = "%s\n(full output in %s)" % (text, output.spill_path)
+
+        return text
+
+    return decode(output, strip=True)
+
+
+def _text(output):
+    """
+    :param _CappedOutput|bytes|str|None output: Captured output
+    :return str|None: Decoded output
+    """
+    if isinstance(output, _CappedOutput):
+        return output.text()
+
+    return decode(output, strip=True)
+
+
+def _iter_chunks(streams, chunk_size=65536, deadline=None):
+    """
+    Yield output chunks from 'streams' as they arrive, without blocking on one stream while another one has data
+
+    :param iterable streams: Pipes to read from (typically: stdout and stderr of a process, None items are ignored)
+    :param int chunk_size: Max number of bytes to read at once
+    :param float|None deadline: Epoch after which to give up (raises _TimedOut)
+    :return: Tuples (stream, chunk), where 'stream' is the one from 'streams' that 'chunk' was read from
+    """
+    streams = dict((s.fileno(), s) for s in streams if s is not None)
+    poller = _Poller(streams)
+    try:
+        while streams:
+            timeout = None
+            if deadline:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    raise _TimedOut()
+
+            for fd in poller.ready(timeout):
+                chunk = os.read(fd, chunk_size)
+                if chunk:
+                    yield streams[fd], chunk
+
+                else:
+                    poller.unregister(fd)
+                    streams.pop(fd).close()
+
+    finally:
+        poller.close()
+
+
+class _Poller(object):
+    """Wait for file descriptors to be readable via poll/epoll/kqueue (select() can't handle fds >= FD_SETSIZE)"""
+
+    def __init__(self, fds):
+        if selectors is None:  # pragma: no cover, python2
+            self._selector = None
+            self._poll = select.poll()
+            for fd in fds:
+                self._poll.register(fd, select.POLLIN)
+
+        else:
+            self._selector = selectors.DefaultSelector()
+            for fd in fds:
+                self._selector.register(fd, selectors.EVENT_READ)
+
+    def ready(self, timeout=None):
+        """
+        :param float|None timeout: Max number of seconds to wait for (wait indefinitely if None)
+        :return list[int]: File descriptors that are ready to be read from (or have reached EOF)
+        """
+        if self._selector is None:  # pragma: no cover, python2
+            return [fd for fd, _ in self._poll.poll(None if timeout is None else timeout * 1000)]
+
+        return [key.fd for key, _ in self._selector.select(timeout)]
+
+    def unregister(self, fd):
+        if self._selector is None:  # pragma: no cover, python2
+            self._poll.unregister(fd)
+
+        else:
+            self._selector.unregister(fd)
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
+
+
+def _iter_lines(p, deadline=None):
+    """
+    :param subprocess.Popen p: Process to read output from
+    :param float|None deadline: Epoch after which to give up (raises _TimedOut)
+    :return: Tuples (stream, line), lines are decoded and have their trailing newline removed
+    """
+    pending = {}
+    for stream, chunk in _iter_chunks((p.stdout, p.stderr), deadline=deadline):
+        lines = (pending.pop(stream, b"") + chunk).split(b"\n")
+        pending[stream] = lines.pop()
+        for line in lines:
+            yield stream, decode(line)
+
+    for stream, rest in pending.items():
+        if rest:
+            yield stream, decode(rest)
@@ -0,0 +1,95 @@
+"""
+asyncio flavor of runez.program.run() (python3 only)
+
+Imported on demand only (not from runez.program), to avoid paying for 'import asyncio' when it isn't needed.
+
+Usage:
+    from runez.program_async import arun
+
+    output = await arun("git", "fetch")
+"""
+
+import asyncio
+import os
+import signal
+import subprocess  # nosec
+import time
+
+from runez.convert import short
+from runez.hooks import RunEvent, RunHooks
+from runez.program import _close_redirects, _fatal, _report_usage, _run_outcome, _run_prelude
+from runez.system import abort
+
+
+async def arun(program, *args, **kwargs):
+    """
+    Run 'program' with 'args', without blocking the event loop
+
+    Accepts the same arguments as run() (except 'capture_limit' and 'spill'),
+    the child process is killed if the coroutine is cancelled.
+    Only wall time is reported in 'usage' (CPU time and max RSS are not available here)
+    """
+    full_path, args, options = _run_prelude(program, args, kwargs)
+    if not full_path:
+        return options["result"]
+
+    fatal = options["fatal"]
+    kwargs.setdefault("stdout", subprocess.PIPE)
+    kwargs.setdefault("stderr", subprocess.PIPE)
+    started = time.time()
+    try:
+        p = await asyncio.create_subprocess_exec(full_path, *args, **kwargs)
+        if RunHooks.on_start:
+            RunHooks.fire(RunHooks.on_start, RunEvent(program=full_path, args=args, pid=p.pid))
+
+        try:
+            output, err = await asyncio.wait_for(p.communicate(_input_bytes(options["input"])), options["timeout"])
+
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if p.returncode is None:
+                _kill(p, options)
+                await p.wait()
+
+            if isinstance(e, asyncio.CancelledError):
+                raise
+
+            return abort("%s timed out after %ss", short(program), options["timeout"], fatal=_fatal(options))
+
+        _report_usage(program, full_path, args, p, started, None, options, output=output, err=err)
+        return _run_outcome(program, p.returncode, output, err, fatal, options["include_error"], result=options["run_result"])
+
+    except asyncio.CancelledError:
+        raise
+
+    except Exception as e:
+        return abort("%s failed: %s", short(program), e, exc_info=e, fatal=_fatal(options))
+
+    finally:
+        _close_redirects(options)
+
+
+def _kill(p, options):
+    """
+    :param asyncio.subprocess.Process p: Process to kill (along with its process group, if it was started with a 'timeout')
+    :param dict options: Options from _run_prelude()
+    """
+    try:
+        if options["timeout"]:
+            os.killpg(p.pid, signal.SIGKILL)
+
+        else:
+            p.kill()
+
+    except OSError:  # pragma: no cover, process already exited
+        pass
+
+
+def _input_bytes(data):
+    """
+    :param bytes|iterable|None data: 'input' given to arun()
+    :return bytes|None: Corresponding bytes (asyncio's communicate() needs all input upfront)
+    """
+    if data is None or isinstance(data, bytes):
+        return data
+
+    return b"".join(c if isinstance(c, bytes) else c.encode("utf-8") for c in data)
@@ -0,0 +1,151 @@
+"""
+Persistent cache of the output of idempotent programs, see run(..., cache=True)
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from runez.config import to_bytesize
+from runez.convert import short
+from runez.path import ensure_folder
+
+
+LOG = logging.getLogger(__name__)
+
+
+class RunCache(object):
+    """
+    Persistent (on disk) cache of the output of idempotent programs, such as 'git --version' or 'uname -a'
+
+    Entries are keyed on program's full path (and its mtime/inode/size), args, working dir, and relevant env vars.
+    Only runs without custom stdin/stdout/stderr that succeeded are cached.
+    """
+
+    env_vars = ("PATH", "HOME", "LANG", "LC_ALL", "PYTHONPATH")  # Env vars considered relevant (when no explicit 'env' is given)
+
+    _default = None
+
+    def __init__(self, folder=None, ttl=86400, max_size="16m"):
+        """
+        :param str|None folder: Folder where to store cache entries (default: ~/.cache/runez/run)
+        :param int|float ttl: Time to live of entries, in seconds
+        :param int|str max_size: Max total size of cache entries, oldest entries are evicted beyond that
+        """
+        self.folder = folder or os.path.join(os.path.expanduser("~"), ".cache", "runez", "run")
+        self.ttl = ttl
+        self.max_size = to_bytesize(max_size)
+
+    def __repr__(self):
+        return short(self.folder)
+
+    @classmethod
+    def default(cls):
+        """Cache used when run() is called with cache=True"""
+        if cls._default is None:
+            cls._default = cls()
+
+        return cls._default
+
+    def key(self, full_path, args, kwargs, path_env=None):
+        """
+        :param str full_path: Full path to program
+        :param list args: Command line args
+        :param dict kwargs: Keyword args to pass through to Popen
+        :param dict|EnvProfile|None path_env: Env vars customized via 'path_env'
+        :return str|None: Cache key, None if run is not cacheable
+        """
+        if any(k not in ("env", "cwd") for k in kwargs):
+            return None
+
+        try:
+            st = os.stat(full_path)
+
+        except OSError:
+            return None
+
+        env = kwargs.get("env")
+        if env is None:
+            env = dict((k, os.environ.get(k)) for k in self.env_vars)
+
+        cwd = kwargs.get("cwd") or os.getcwd()
+        if path_env is None or isinstance(path_env, dict):
+            path_env = sorted((path_env or {}).items())
+
+        else:
+            path_env = path_env.key  # EnvProfile
+
+        data = [full_path, st.st_mtime, st.st_ino, st.st_size, args, cwd, sorted(env.items()), path_env]
+        return hashlib.sha256(json.dumps(data).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        :param str key: Cache key
+        :return (bytes, bytes)|None: Cached stdout and stderr, if available and not expired
+        """
+        path = os.path.join(self.folder, key)
+        try:
+            with open(path, "rt") as fh:
+                entry = json.load(fh)
+
+            if time.time() - entry["time"] <= self.ttl:
+                return base64.b64decode(entry["stdout"]), base64.b64decode(entry["stderr"])
+
+            os.unlink(path)
+
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+
+        return None
+
+    def put(self, key, stdout, stderr):
+        """
+        :param str key: Cache key
+        :param bytes stdout: Captured stdout
+        :param bytes stderr: Captured stderr
+        """
+        entry = dict(time=time.time(), stdout=base64.b64encode(stdout).decode("ascii"), stderr=base64.b64encode(stderr).decode("ascii"))
+        path = os.path.join(self.folder, key)
+        try:
+            ensure_folder(self.folder, folder=True, fatal=False, logger=None)
+            fd, tmp = tempfile.mkstemp(prefix=".%s-" % key[:8], dir=self.folder)
+            with os.fdopen(fd, "wt") as fh:
+                json.dump(entry, fh)
+
+            os.rename(tmp, path)  # Atomic, concurrent readers see either previous or new entry
+            self._evict()
+
+        except (IOError, OSError) as e:
+            LOG.debug("Can't save cache entry %s: %s", short(path), e)
+
+    def clear(self):
+        """Remove all cache entries"""
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _evict(self):
+        """Delete oldest entries, if total size exceeds 'max_size'"""
+        entries = []
+        for name in os.listdir(self.folder):
+            try:
+                st = os.stat(os.path.join(self.folder, name))
+                entries.append((st.st_mtime, st.st_size, name))
+
+            except OSError:  # pragma: no cover, deleted concurrently
+                pass
+
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+
+            try:
+                os.unlink(os.path.join(self.folder, name))
+                total -= size
+
+            except OSError:  # pragma: no cover, deleted concurrently
+                pass
@@ -6,9 +6,11 @@ import io
 import json
 import logging
 import os
+import sys
 
-from runez.base import string_type
+from runez.base import decode, string_type
 from runez.convert import resolved_path, short
+from runez.file import AtomicOutput
 from runez.path import ensure_folder
 from runez.system import abort, is_dryrun
 
@@ -170,7 +172,7 @@ def read_json(path, default=None, fatal=True, logger=None):
         return abort("Couldn't read %s: %s", short(path), e, fatal=(fatal, default))
 
 
-def save_json(data, path, fatal=True, logger=None, sort_keys=True, indent=2, **kwargs):
+def save_json(data, path, fatal=True, logger=None, sort_keys=True, indent=2, atomic=False, fsync=None, **kwargs):
     """
     Args:
         data (object | None): Data to serialize and save
@@ -179,6 +181,8 @@ def save_json(data, path, fatal=True, logger=None, sort_keys=True, indent=2, **k
         logger (callable | None): Logger to use
         sort_keys (bool): Save json with sorted keys
         indent (int): Indentation to use
+        atomic (bool): If True, write to a temp file first, then rename it to `path` (readers never see partial content)
+        fsync (str | None): Durability: None (leave it to the OS), "file" (fsync file), or "dir" (fsync file and its folder)
         **kwargs: Passed through to `json.dump()`
 
     Returns:
@@ -200,9 +204,14 @@ def save_json(data, path, fatal=True, logger=None, sort_keys=True, indent=2, **k
         if indent:
             kwargs.setdefault("separators", (",", ': '))
 
-        with open(path, "wt") as fh:
-            json.dump(data, fh, sort_keys=sort_keys, indent=indent, **kwargs)
-            fh.write("\n")
+        with AtomicOutput(path, "wt", atomic=atomic, fsync=fsync) as fh:
+            if sys.version_info[0] >= 3:
+                json.dump(data, fh, sort_keys=sort_keys, indent=indent, **kwargs)
+
+            else:  # pragma: no cover, python2: json.dump() writes a mix of str and unicode, text mode io.open() wants unicode
+                fh.write(decode(json.dumps(data, sort_keys=sort_keys, indent=indent, **kwargs)))
+
+            fh.write(u"\n")
 
         if logger:
             logger("Saved %s", short(path))
@@ -0,0 +1,45 @@
+"""
+Compare launch latency of run() via fork/exec (Popen) vs os.posix_spawn(), for various RSS sizes of the parent process
+
+Note that on linux, python 3.10+ Popen already uses vfork() when it can, so difference is mostly visible on older pythons.
+
+Usage:
+    python tests/benchmark_spawn.py [iterations]
+"""
+
+import sys
+import time
+
+import runez
+
+
+def launch_latency(iterations, spawn):
+    """
+    :param int iterations: How many times to launch a trivial program
+    :param bool spawn: Passed through to run()
+    :return float: Average time it took to run 'true', in milliseconds
+    """
+    started = time.time()
+    for _ in range(iterations):
+        runez.run("true", logger=None, spawn=spawn)
+
+    return (time.time() - started) * 1000.0 / iterations
+
+
+def main(iterations=200):
+    ballast = []
+    allocated = 0
+    print("%11s %12s %12s" % ("RSS", "Popen (ms)", "spawn (ms)"))
+    for size in (0, 256, 1024, 2048):
+        # Allocate 'size' MB in total, and touch every page so that they're really resident
+        chunk = bytearray((size - allocated) * 1024 * 1024)
+        chunk[::4096] = b"x" * len(range(0, len(chunk), 4096))
+        ballast.append(chunk)
+        allocated = size
+        popen = launch_latency(iterations, spawn=False)
+        spawn = launch_latency(iterations, spawn=True)
+        print("%8s MB %12.3f %12.3f" % (size, popen, spawn))
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,57 @@
+import os
+import time
+
+import runez
+
+
+def test_background(temp_folder, logged):
+    with runez.CaptureOutput(dryrun=True) as dryrun_logged:
+        assert "Would run: " in runez.run_background("sleep", "10", pidfile="sleep.pid")
+        assert "> /dev/null 2> /dev/null" in dryrun_logged.pop()
+        assert not os.path.exists("sleep.pid")
+
+    assert runez.run_background("/dev/null/foo", fatal=False) is False
+    assert "is not installed" in logged.pop()
+
+    # Program exiting on its own
+    bg = runez.run_background("sh", "-c", "echo hello; exit 3", stdout="out.log")
+    assert bg.wait(5)
+    assert not bg.is_alive
+    assert bg.exit_code == 3
+    assert runez.first_line("out.log") == "hello"
+    assert bg.stop() == 0
+    assert "Started %s in background, pid %s" % (runez.which("sh"), bg.pid) in logged.pop()
+
+    # Program that exits on SIGTERM, found again via its pidfile
+    bg = runez.run_background("sleep", "10", pidfile="sleep.pid")
+    assert runez.first_line("sleep.pid") == str(bg.pid)
+    assert not bg.wait(0.1)
+    assert bg.exit_code is None
+
+    found = runez.BackgroundProcess.from_pidfile("sleep.pid")
+    assert str(found) == str(bg) == "pid %s" % bg.pid
+    assert found.is_alive
+    with runez.CaptureOutput(dryrun=True) as dryrun_logged:
+        assert found.stop() == 1
+        assert "Would stop pid %s" % bg.pid in dryrun_logged.pop()
+        assert found.is_alive
+
+    assert bg.stop() == 1
+    assert "Stopping pid %s" % bg.pid in logged.pop()
+    assert not bg.is_alive
+    assert bg.exit_code == -15
+    assert not os.path.exists("sleep.pid")
+    assert runez.BackgroundProcess.from_pidfile("sleep.pid") is None
+
+    # Program ignoring SIGTERM (along with its children) gets SIGKILL-ed
+    bg = runez.run_background("sh", "-c", "trap '' TERM; sleep 10 & sleep 10")
+    time.sleep(0.2)
+    assert bg.stop(grace=0.2) == 1
+    assert "did not exit within 0.2s, killing it" in logged.pop()
+    assert bg.exit_code == -9
+
+    # Custom loggers are called with one, already formatted, message
+    messages = []
+    bg = runez.run_background("sleep", "10", logger=messages.append)
+    assert bg.stop(logger=messages.append) == 1
+    assert messages[-2:] == ["Started %s in background, pid %s" % (runez.which("sleep"), bg.pid), "Stopping pid %s" % bg.pid]
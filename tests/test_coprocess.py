@@ -0,0 +1,73 @@
+import sys
+import time
+
+import runez
+
+
+COPROCESS_SCRIPT = """
+import sys, time
+for line in sys.stdin:
+    line = line.strip()
+    if line == "die":
+        sys.stderr.write("dying\\n")
+        sys.exit(3)
+    if line == "slow":
+        time.sleep(5)
+    sys.stdout.write(line.upper() + "\\n")
+    sys.stdout.flush()
+"""
+
+
+def test_coprocess(logged):
+    with runez.CaptureOutput(dryrun=True) as dryrun_logged:
+        with runez.Coprocess("cat") as c:
+            assert c.query("foo") == "Would run: %s " % runez.which("cat")
+            assert not c.is_alive
+            assert "Would run: %s" % runez.which("cat") in dryrun_logged.pop()
+
+    with runez.Coprocess("/dev/null/foo", fatal=False) as c:
+        assert c.query("foo") is False
+        assert "is not installed" in logged.pop()
+
+    with runez.Coprocess("cat") as c:
+        assert c.is_alive
+        assert c.query("hello") == "hello"
+        assert c.query(b"world\n") == "world"
+        assert c.send(b"abc\ndef", size=4) == b"abc\n"
+        assert c.send(b"\n", delimiter=b"e") == "d"
+        assert c.read_until(b"\n") == "f".encode()
+        assert c.queries == 4
+        assert c.restarts == 0
+
+    assert not c.is_alive
+    assert "Running: %s" % runez.which("cat") in logged
+    assert "Ran cat: exit code 0" in logged.pop()
+
+    c = runez.Coprocess(sys.executable, "-c", COPROCESS_SCRIPT, timeout=0.5, max_restarts=1, fatal=False)
+    with c:
+        assert c.query("hi") == "HI"
+        pid = c.pid
+
+        # Program is restarted if it dies, and query re-sent
+        assert c.query("die") is False
+
+        assert "died (exited with code 3: dying), restarting it (1/1)" in logged
+        assert "died: exited with code 3: dying" in logged.pop()
+        assert not c.is_alive
+
+        assert c.query("again") == "AGAIN"
+        assert c.pid != pid
+
+        # Program is killed on timeout, and restarted on next query
+        assert c.query("slow") is False
+        assert "timed out after 0.5s" in logged.pop()
+        assert not c.is_alive
+        assert c.query("hi", timeout=5) == "HI"
+
+    # Program is killed right away on query timeout, even without a constructor 'timeout'
+    with runez.Coprocess(sys.executable, "-c", COPROCESS_SCRIPT, fatal=False) as c:
+        started = time.time()
+        assert c.query("slow", timeout=0.5) is False
+        assert time.time() - started < 3
+        assert "timed out after 0.5s" in logged.pop()
+        assert not c.is_alive
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+import pytest
+
+import runez
+from runez.graph import Step, TaskGraph
+
+
+def test_steps():
+    with pytest.raises(ValueError):
+        Step("foo", None, check="foo")
+
+    s1 = Step("s1", ["echo", "hello"])
+    assert str(s1) == "s1"
+    assert s1.description == "echo hello"
+    assert not s1.is_up_to_date({})  # No outputs: always runs
+
+    s2 = Step("s2", test_steps, inputs=["a"], outputs=["b"])
+    assert s2.description == "test_steps"
+
+    graph = TaskGraph()
+    graph.add("s1", ["echo"])
+    with pytest.raises(ValueError):
+        graph.add("s1", ["echo"])
+
+    graph.add("s2", ["echo"], depends=["s3"])
+    assert graph.run(fatal=False) == -1
+
+    graph.add("s3", ["echo"], depends=["s2"])
+    with runez.CaptureOutput() as logged:
+        assert graph.run(fatal=False) == -1
+        assert "Dependency cycle between steps: s2, s3" in logged.pop()
+
+
+def test_graph(temp_folder, logged):
+    runez.write("a.txt", "hello")
+    calls = []
+
+    def concat():
+        calls.append("concat")
+        runez.write("ab.txt", runez.first_line("a.txt") + runez.first_line("b.txt"))
+
+    graph = TaskGraph(max_workers=2, state_path="state.json")
+    graph.add("final", concat, inputs=["a.txt", "b.txt"], outputs=["ab.txt"])
+    graph.add("b", ["sh", "-c", "echo world > b.txt"], inputs=["a.txt"], outputs=["b.txt"], check="hash")
+    graph.add("always", lambda: calls.append("always"))
+    assert str(graph) == "3 steps"
+    assert [s.name for s in graph.plan()] == ["b", "always", "final"]
+
+    with runez.CaptureOutput(dryrun=True) as dryrun_logged:
+        assert graph.run() == 3
+        assert "Would run step 'final': concat" in dryrun_logged
+        assert "Would run step 'b': sh -c" in dryrun_logged.pop()
+        assert not calls
+
+    assert graph.run() == 3
+    assert runez.first_line("ab.txt") == "helloworld"
+    assert calls == ["always", "concat"] or calls == ["concat", "always"]
+    assert "Ran 3 steps (0 up to date)" in logged.pop()
+    assert runez.read_json("state.json")["b"] == graph.steps[1].fingerprint()
+
+    # Nothing to do on 2nd run (except for step without outputs)
+    graph = TaskGraph(state_path="state.json")
+    graph.add("b", ["sh", "-c", "echo world > b.txt"], inputs=["a.txt"], outputs=["b.txt"], check="hash")
+    graph.add("final", concat, inputs=["a.txt", "b.txt"], outputs=["ab.txt"])
+    with runez.CaptureOutput(dryrun=True) as dryrun_logged:
+        assert graph.run() == 0
+        assert "Step 'final' is up to date" in dryrun_logged.pop()
+
+    assert graph.run() == 0
+    assert [s.status for s in graph.steps] == ["skipped", "skipped"]
+    assert "Ran 0 steps (2 up to date)" in logged.pop()
+
+    # Touching 'a.txt' without changing its contents: 'b' (hash) is up to date, 'final' (mtime) is not
+    time.sleep(0.01)
+    runez.write("a.txt", "hello")
+    assert graph.run() == 1
+    assert [s.status for s in graph.steps] == ["skipped", "ran"]
+
+    # Dryrun assumes steps depending on a step that would run would run as well
+    runez.write("a.txt", "hello2")
+    with runez.CaptureOutput(dryrun=True) as dryrun_logged:
+        assert graph.run() == 2
+        assert "Would run step 'final'" in dryrun_logged.pop()
+
+    # Failed step prevents dependent steps from running
+    graph = TaskGraph()
+    graph.add("c", ["sh", "-c", "echo oops >&2; exit 1"], outputs=["c.txt"])
+    graph.add("final", concat, inputs=["c.txt"], outputs=["ab.txt"])
+    assert graph.run(fatal=False) == -1
+    assert "Step 'c' failed: oops" in logged.pop()
+    assert [s.status for s in graph.steps] == ["failed", None]
+    assert not os.path.exists("c.txt")
+
+
+def test_parallel():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    graph = TaskGraph(max_workers=3)
+    for i in range(8):
+        graph.add("s%s" % i, work)
+
+    started = time.time()
+    assert graph.run() == 8
+    assert max(peak) == 3
+    assert time.time() - started < 0.05 * 8
@@ -0,0 +1,56 @@
+import runez
+
+
+def test_run_hooks():
+    started = []
+    crashed = []
+
+    def crash(event):
+        crashed.append(event)
+        raise Exception("oops")
+
+    stats = runez.RunStats().start()
+    runez.RunHooks.add(on_start=started.append, on_finish=crash)
+    try:
+        with runez.CaptureOutput() as logged:
+            assert runez.run("echo", "hello") == "hello"
+            assert "Run hook" in logged.pop()
+
+        assert runez.run("ls", "some-file", fatal=False) is False
+        assert runez.run_pipeline(["echo", "hello"], ["cat"]) == "hello"
+
+    finally:
+        runez.RunHooks.remove(crash)
+        runez.RunHooks.remove(started.append)
+        stats.stop()
+
+    assert not runez.RunHooks.on_start and not runez.RunHooks.on_finish
+    assert len(started) == 4
+    assert str(started[0]) == "%s hello" % runez.program.which("echo")
+    assert started[0].pid
+
+    event = crashed[0]
+    assert event.exit_code == 0
+    assert event.output_size == 6
+    assert event.error_size == 0
+    assert event.duration > 0
+
+    assert sorted(stats.programs) == ["cat", "echo", "ls"]
+    ls = stats.programs["ls"]
+    assert ls.count == 1
+    assert ls.failure_rate == 1
+    assert ls.p95 == ls.average == ls.total_time
+    assert stats.programs["echo"].count == 2
+    assert stats.programs["echo"].failures == 0
+    assert "echo: 2 runs" in stats.report()
+
+    # Durations retained are capped
+    p = runez.hooks.ProgramStats("foo", max_samples=10)
+    for i in range(100):
+        p.record(i, i % 4)
+
+    assert p.count == 100
+    assert p.failure_rate == 0.75
+    assert p.durations == list(range(90, 100))
+    assert p.p95 == 99
+    assert str(p) == "foo: 100 runs, 4950.000s total, 49.500s avg, 99.000s p95, 75% failed"
@@ -1,8 +1,10 @@
+import errno
 import logging
 import os
+import stat
 
 import pytest
-from mock import patch
+from mock import Mock, patch
 
 import runez
 
@@ -247,3 +249,256 @@ def test_conf():
     del expected[""]
     del expected["s2"]
     assert runez.get_conf(SAMPLE_CONF.splitlines(), keep_empty=False) == expected
+
+
+def test_copy_strategies(temp_folder, logged):
+    runez.write("sample", "hello")
+    os.chmod("sample", 0o751)
+    assert runez.copy("sample", "copy1") == 1
+    strategy = logged.pop().strip().rpartition("(")[2].rstrip(")")
+    assert strategy in runez.file.COPY_STRATEGIES
+    assert runez.first_line("copy1") == "hello"
+    assert os.stat("copy1").st_mode == os.stat("sample").st_mode
+
+    # Each strategy falls back to the next one when it fails
+    unsupported = set(runez.file._UNSUPPORTED_COPIES)
+    with patch.dict(runez.file._KERNEL_COPIES, {k: Mock(side_effect=OSError(errno.EXDEV, "oops")) for k in runez.file._KERNEL_COPIES}):
+        assert runez.file._copy_file("sample", "copy2") == "shutil"
+        assert runez.first_line("copy2") == "hello"
+
+    runez.file._UNSUPPORTED_COPIES.clear()
+    runez.file._UNSUPPORTED_COPIES.update(unsupported)
+
+    # Strategies not reporting an error but not copying all the data are not trusted
+    with patch.dict(runez.file._KERNEL_COPIES, {k: Mock() for k in runez.file._KERNEL_COPIES}):
+        assert runez.file._copy_file("sample", "copy3") == "shutil"
+        assert runez.first_line("copy3") == "hello"
+
+    # Empty and pseudo-files go through shutil
+    runez.touch("empty")
+    assert runez.file._copy_file("empty", "copy4") == "shutil"
+
+    runez.write("folder/a", "a")
+    runez.write("folder/b", "b")
+    assert runez.copy("folder", "folder2") == 1
+    assert "Copy folder -> folder2 (%s)" % strategy in logged.pop()
+
+
+@pytest.mark.skipif(not hasattr(os, "scandir"), reason="Parallel copy requires os.scandir()")
+def test_parallel_copy(temp_folder, logged):
+    for i in range(5):
+        for j in range(4):
+            runez.write("src/d%s/sub/f%s" % (i, j), "%s-%s" % (i, j))
+
+        os.symlink("sub", "src/d%s/link" % i)
+        os.utime("src/d%s/sub" % i, (1000, 1000))
+
+    os.symlink("not-there", "src/dangling")
+    os.chmod("src/d0/sub/f0", 0o700)
+    os.utime("src/d0/sub/f0", (2000, 2000))
+
+    assert runez.copy("src", "dest", workers=4) == 1
+    assert "Copy src -> dest (" in logged.pop()
+    for i in range(5):
+        assert os.path.islink("dest/d%s/link" % i)
+        assert os.readlink("dest/d%s/link" % i) == "sub"
+        assert runez.first_line("dest/d%s/link/f3" % i) == "%s-3" % i
+        assert os.path.getmtime("dest/d%s/sub" % i) == 1000
+
+    assert os.path.islink("dest/dangling")
+    assert os.stat("dest/d0/sub/f0").st_mode == os.stat("src/d0/sub/f0").st_mode
+    assert os.path.getmtime("dest/d0/sub/f0") == 2000
+
+    # Same outcome as sequential copy
+    assert runez.copy("src", "dest2") == 1
+    listing = sorted(os.path.relpath(os.path.join(r, n), "dest") for r, ds, fs in os.walk("dest") for n in ds + fs)
+    listing2 = sorted(os.path.relpath(os.path.join(r, n), "dest2") for r, ds, fs in os.walk("dest2") for n in ds + fs)
+    assert listing == listing2
+
+    # Errors are collected and reported at the end
+    os.mkfifo("src/fifo")
+    assert runez.copy("src", "dest3", workers=4, fatal=False) == -1
+    assert "src/fifo is a named pipe" in logged.pop()
+    assert runez.first_line("dest3/d4/sub/f3") == "4-3"
+
+
+def test_sync(temp_folder, logged):
+    assert runez.sync(None, "dest") == runez.file.SyncResult()
+    assert runez.sync("src", "dest", fatal=False) is None
+    assert "src does not exist" in logged.pop()
+
+    runez.write("src/a", "hello")
+    runez.write("src/sub/b", "world!")
+    os.symlink("a", "src/link")
+    with runez.CaptureOutput(dryrun=True) as dryrun_logged:
+        r = runez.sync("src", "dest")
+        assert r.copied == 3 and r.copied_bytes == 12
+        assert "Would sync src -> dest: copied 3 files" in dryrun_logged.pop()
+        assert not os.path.exists("dest")
+
+    r = runez.sync("src", "dest")
+    assert str(r) == "copied 3 files (12 bytes), skipped 0 (0 bytes), deleted 0 (0 bytes)"
+    assert "Synced src -> dest: copied 3 files" in logged.pop()
+    assert runez.first_line("dest/sub/b") == "world!"
+    assert os.readlink("dest/link") == "a"
+
+    # 2nd sync is a no-op
+    r = runez.sync("src", "dest")
+    assert (r.copied, r.skipped, r.skipped_bytes) == (0, 3, 11 + os.lstat("src/link").st_size)
+
+    # Only modified files are copied, extra files are deleted only when asked to
+    runez.write("src/a", "hello2")
+    runez.write("dest/extra/c", "extra")
+    r = runez.sync("src", "dest")
+    assert (r.copied, r.copied_bytes, r.skipped, r.deleted) == (1, 6, 2, 0)
+    assert runez.first_line("dest/a") == "hello2"
+
+    with runez.CaptureOutput(dryrun=True):
+        r = runez.sync("src", "dest", delete_extra=True)
+        assert (r.copied, r.deleted, r.deleted_bytes) == (0, 1, 5)
+        assert os.path.exists("dest/extra/c")
+
+    r = runez.sync("src", "dest", delete_extra=True)
+    assert (r.copied, r.skipped, r.deleted, r.deleted_bytes) == (0, 3, 1, 5)
+    assert not os.path.exists("dest/extra")
+
+    # Same size and mtime: skipped, unless checksum is used
+    runez.write("dest/a", "HELLO2")
+    os.utime("dest/a", (os.path.getmtime("src/a"),) * 2)
+    assert runez.sync("src", "dest").copied == 0
+    r = runez.sync("src", "dest", checksum=True)
+    assert (r.copied, r.skipped) == (1, 2)
+    assert runez.first_line("dest/a") == "hello2"
+
+    # Same contents, different mtime: checksum skips file, but fixes its mtime
+    os.utime("dest/a", (1000, 1000))
+    assert runez.sync("src", "dest", checksum=True).copied == 0
+    assert runez.sync("src", "dest").copied == 0
+
+    # Type changes
+    runez.delete("dest/sub")
+    runez.write("dest/sub", "now a file")
+    runez.delete("dest/link")
+    os.mkdir("dest/link")
+    r = runez.sync("src", "dest")
+    assert (r.copied, r.deleted) == (2, 1)
+    assert runez.first_line("dest/sub/b") == "world!"
+    assert os.readlink("dest/link") == "a"
+
+    runez.delete("dest/link")
+    runez.write("dest/link", "a file")
+    runez.delete("dest/a")
+    os.symlink("sub", "dest/a")
+    r = runez.sync("src", "dest")
+    assert (r.copied, r.deleted) == (2, 2)
+    assert os.readlink("dest/link") == "a"
+    assert not os.path.islink("dest/a")
+    assert runez.first_line("dest/a") == "hello2"
+
+    # Destination can't be inside source
+    assert runez.sync("src", "./src").copied == 0
+    assert runez.sync("src", "src/backup", fatal=False) is None
+    assert "Can't sync src -> src/backup: destination contained in source" in logged.pop()
+    assert not os.path.exists("src/backup")
+
+    # Single file
+    r = runez.sync("src/a", "other/a")
+    assert r.copied == 1
+    assert runez.sync("src/a", "other/a").skipped == 1
+
+    with patch("runez.file._copy_file", side_effect=Exception("oops")):
+        assert runez.sync("src/a", "other/b", fatal=False) is None
+        assert "Can't sync src/a -> other/b: oops" in logged.pop()
+
+
+def test_atomic_write(temp_folder):
+    with pytest.raises(ValueError):
+        runez.file.AtomicOutput("foo", fsync="foo")
+
+    assert runez.write("a/foo", "hello", atomic=True, fsync="dir") == 1
+    assert runez.first_line("a/foo") == "hello"
+    assert os.listdir("a") == ["foo"]
+    assert runez.write("a/plain", "hello") == 1
+    assert stat.S_IMODE(os.stat("a/foo").st_mode) == stat.S_IMODE(os.stat("a/plain").st_mode)
+    assert runez.delete("a/plain") == 1
+
+    # umask in effect at the time of the write applies (not the one at import time)
+    umask = os.umask(0o077)
+    try:
+        assert runez.write("a/private", "hello", atomic=True) == 1
+        assert stat.S_IMODE(os.stat("a/private").st_mode) == 0o600
+        assert runez.delete("a/private") == 1
+
+    finally:
+        os.umask(umask)
+
+    # Mode of existing file is preserved
+    os.chmod("a/foo", 0o600)
+    assert runez.write("a/foo", "hello2", atomic=True, fsync="file") == 1
+    assert runez.first_line("a/foo") == "hello2"
+    assert stat.S_IMODE(os.stat("a/foo").st_mode) == 0o600
+
+    # Target is left untouched on failure
+    with pytest.raises(Exception, match="oops"):
+        with runez.file.AtomicOutput("a/foo", "wt") as fh:
+            fh.write(u"partial")
+            raise Exception("oops")
+
+    assert runez.first_line("a/foo") == "hello2"
+    assert os.listdir("a") == ["foo"]
+
+    with patch("os.fsync", side_effect=OSError("oops")):
+        assert runez.write("a/foo", "hello3", atomic=True, fsync="file", fatal=False) == -1
+        assert runez.first_line("a/foo") == "hello2"
+        assert os.listdir("a") == ["foo"]
+
+    # Folder fsyncs are deferred to the end of the batch, and done once per folder
+    with patch("os.fsync") as fsync:
+        with runez.file.FsyncBatch() as batch:
+            for i in range(10):
+                assert runez.write("a/f%s" % i, "%s" % i, atomic=True, fsync="dir") == 1
+                assert runez.save_json({"i": i}, "b/f%s.json" % i, atomic=True, fsync="dir") == 1
+
+            assert str(batch) == "2 pending folder fsyncs"
+            assert fsync.call_count == 20  # Files only
+
+        assert fsync.call_count == 22
+
+    assert runez.read_json("b/f3.json") == {"i": 3}
+    assert len(os.listdir("b")) == 10
+
+
+def test_streaming_write(temp_folder, logged):
+    assert runez.write("bytes", b"\x00\x01hello", logger=logging.debug) == 1
+    assert "Writing 7 bytes to bytes" in logged.pop()
+    with open("bytes", "rb") as fh:
+        assert fh.read() == b"\x00\x01hello"
+
+    assert runez.write("view", memoryview(b"abcdef")[2:], logger=logging.debug) == 1
+    assert "Writing 4 bytes to view" in logged.pop()
+    assert runez.first_line("view") == "cdef"
+
+    def generate():
+        for i in range(1000):
+            yield "line %s\n" % i if i % 2 else b"bytes line %s\n" % str(i).encode()
+
+    with runez.CaptureOutput(dryrun=True) as dryrun_logged:
+        assert runez.write("report", generate()) == 1
+        assert "Would write to report" in dryrun_logged.pop()
+        assert not os.path.exists("report")
+
+    assert runez.write("report", generate(), logger=logging.debug, atomic=True, buffer_size=1024) == 1
+    assert "Wrote %s bytes to report" % os.path.getsize("report") in logged.pop()
+    lines = runez.get_lines("report")
+    assert len(lines) == 1000
+    assert lines[998:] == ["bytes line 998\n", "line 999\n"]
+
+    # Generator crashing midway leaves target untouched when writing atomically
+    def crash():
+        yield "partial"
+        raise Exception("oops")
+
+    assert runez.write("report", crash(), atomic=True, fatal=False) == -1
+    assert "Can't write to report: oops" in logged.pop()
+    assert len(runez.get_lines("report")) == 1000
+    assert sorted(os.listdir(".")) == ["bytes", "report", "view"]
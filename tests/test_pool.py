@@ -0,0 +1,38 @@
+import sys
+
+import pytest
+
+import runez
+
+
+def test_run_pool():
+    with runez.CaptureOutput(dryrun=True) as logged:
+        echo = runez.which("echo")
+        assert runez.run_many([["echo", "a"], ["echo", "b"]]) == ["Would run: %s a" % echo, "Would run: %s b" % echo]
+        assert "Ran 2 programs in " in logged.pop()
+
+        # Custom loggers are called with one, already formatted, message
+        messages = []
+        runez.run_many([["echo", "a"]], logger=messages.append)
+        assert messages[-1].startswith("Ran 1 programs in ")
+
+    with runez.CaptureOutput() as logged:
+        sleeper = [sys.executable, "-c", "import sys, time; time.sleep(float(sys.argv[1])); print(sys.argv[1])"]
+        assert runez.run_many([sleeper + ["0.3"], sleeper + ["0.1"]]) == ["0.3", "0.1"]
+        assert runez.run_many([sleeper + ["0.3"], sleeper + ["0.1"]], completion_order=True) == ["0.1", "0.3"]
+        assert "speedup" in logged.pop()
+
+        with runez.RunPool(max_workers=2, logger=None) as pool:
+            ok = pool.submit("echo", "hello")
+            failed = pool.submit("ls", "some-file", fatal=False)
+            aborted = pool.submit("ls", "some-file")
+
+        assert str(ok) == "echo hello"
+        assert ok.result() == "hello"
+        assert failed.result() is False
+        with pytest.raises(runez.system.AbortException):
+            aborted.result()
+
+        assert "exited with code" in logged.pop()
+        assert pool.cumulative >= pool.elapsed / 2
+        assert pool.speedup > 0
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+
+import pytest
+
+import runez
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="No /proc on this platform")
+def test_process_table():
+    table = runez.ProcessTable()
+    assert len(table) > 1
+    assert str(table) == "%s processes" % len(table)
+    assert os.getpid() in table
+    assert 0 not in table
+    assert table.alive([os.getpid(), 0, -1]) == {os.getpid()}
+
+    me = table.get(os.getpid())
+    assert me.ppid == os.getppid()
+    assert me.state in "RS"
+    assert me.cmdline[0] == sys.executable or "python" in me.name
+    assert me.rss > 1024
+    assert abs(me.started - time.time()) < 3600
+    assert me in table.children(os.getppid())
+    assert str(me).startswith("%s " % os.getpid())
+
+    lean = runez.ProcessTable(cmdline=False)
+    assert lean.get(os.getpid()).cmdline is None
+    assert str(lean.get(os.getpid())) == "%s [%s]" % (os.getpid(), me.name)
+
+    p = runez.program._popen(runez.which("sleep"), ["5"], {})
+    try:
+        later = runez.ProcessTable()
+        started, exited = later.diff(table)
+        assert p.pid in [x.pid for x in started]
+        assert not any(x.pid == os.getpid() for x in started + exited)
+
+    finally:
+        p.kill()
+        p.wait()
+
+    gone = runez.ProcessTable()
+    started, exited = gone.diff(later)
+    assert p.pid in [x.pid for x in exited]
+    assert p.pid not in gone
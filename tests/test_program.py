@@ -1,5 +1,8 @@
 import os
+import sys
+import time
 
+import pytest
 from mock import patch
 
 import runez
@@ -95,7 +98,493 @@ def test_run(temp_folder):
         assert "No such file" in logged.pop()
 
 
+def test_env_profile(temp_folder):
+    assert runez.touch("sample") == 1
+    profile = runez.EnvProfile(path_env={"PATH": ":."}, overrides={"SOME_VAR": "foo", "HOME": None})
+    assert str(profile) == "EnvProfile(PATH, HOME, SOME_VAR)"
+    assert profile.computed == 0
+
+    env = profile.env
+    assert env["PATH"].endswith(":.")
+    assert env["SOME_VAR"] == "foo"
+    assert "HOME" not in env
+    assert profile.env is env
+    assert profile.computed == 1
+
+    assert runez.run("ls", path_env=profile) == "sample"
+    assert runez.run("sh", "-c", "echo $SOME_VAR", path_env=profile) == "foo"
+    assert runez.run("sh", "-c", "echo $SOME_VAR", path_env=profile, env={"PATH": "/bin:/usr/bin"}) == "foo"
+    assert profile.computed == 1
+
+    with runez.RunPool(max_workers=2, path_env=profile) as pool:
+        for _ in range(4):
+            pool.submit("sh", "-c", "echo $SOME_VAR")
+
+    assert [t.output for t in pool.tasks] == ["foo"] * 4
+    assert profile.computed == 1
+
+    # Changing os.environ invalidates computed env
+    with patch.dict(os.environ, {"OTHER_VAR": "bar"}):
+        assert runez.run("sh", "-c", "echo $OTHER_VAR $SOME_VAR", path_env=profile) == "bar foo"
+        assert profile.computed == 2
+
+    assert "OTHER_VAR" not in profile.env
+    assert profile.computed == 3
+
+    cache = runez.RunCache(folder="cache")
+    same = runez.EnvProfile(path_env=profile.path_env, overrides=profile.overrides)
+    assert cache.key("/bin/ls", [], {}, profile) == cache.key("/bin/ls", [], {}, same)
+    assert cache.key("/bin/ls", [], {}, profile) != cache.key("/bin/ls", [], {}, runez.EnvProfile(profile.path_env))
+
+
 def test_failed_run(logged):
     with patch("subprocess.Popen", side_effect=Exception("testing")):
         assert runez.run("ls", fatal=False) is False
         assert "ls failed: testing" in logged
+
+
+def test_iter_run(temp_folder):
+    chatter = runez.resolved_path("chatter")
+    assert runez.write(chatter, CHATTER.strip(), fatal=False) == 1
+    assert runez.make_executable(chatter, fatal=False) == 1
+
+    with runez.CaptureOutput(dryrun=True) as logged:
+        assert list(runez.iter_run(chatter)) == []
+        assert "Would run: chatter" in logged.pop()
+
+    with runez.CaptureOutput() as logged:
+        assert list(runez.iter_run(chatter)) == ["chatter", "", ""]
+        assert "Running: chatter" in logged.pop()
+
+        lines = list(runez.iter_run(chatter, include_error=True))
+        assert "chatter" in lines
+        assert any("No such file" in line for line in lines)
+
+        assert list(runez.iter_run("ls", "some-file", fatal=False)) == []
+        assert "exited with code" in logged
+        assert "No such file" in logged.pop()
+
+        # Only the tail of stderr is retained
+        script = "import sys; print('out'); sys.stderr.write('noise\\n' * 10000 + 'oops'); sys.exit(1)"
+        assert list(runez.iter_run(sys.executable, "-c", script, capture_limit=10, fatal=False)) == ["out"]
+        assert "exited with code 1: ...oise\noops" in logged.pop()
+
+        assert list(runez.iter_run("/dev/null", fatal=False)) == []
+        assert "/dev/null is not installed" in logged.pop()
+
+    # Closing the generator early kills the child
+    lines = runez.iter_run("yes")
+    assert next(lines) == "y"
+    lines.close()
+
+
+def test_capped_run(temp_folder):
+    with runez.CaptureOutput() as logged:
+        script = "import sys; sys.stdout.write('a' * 1000 + 'end'); sys.stderr.write('b' * 1000 + 'oops'); sys.exit(%s)"
+        output = runez.run(sys.executable, "-c", script % 0, capture_limit=10)
+        assert output == "aaaaaaaaaa\n... [983 bytes omitted] ...\naaaaaaaend"
+
+        assert runez.run(sys.executable, "-c", script % 1, capture_limit=10, fatal=False) is False
+        assert "exited with code 1: ...bbbbbboops\n...aaaaaaaend" in logged.pop()
+
+        assert runez.run(sys.executable, "-c", script % 1, capture_limit="1k", spill=True, fatal=False) is False
+        message = logged.pop()
+        assert "Full stdout of " in message
+        assert "(full output in " in message
+        spilled = [line for line in message.splitlines() if "Full stderr" in line][0].rpartition(" ")[2]
+        assert runez.first_line(spilled) == "b" * 1000 + "oops"
+        assert runez.delete(spilled) == 1
+
+        output = runez.run(sys.executable, "-c", script % 0, include_error=True, capture_limit="1k")
+        assert output == "a" * 1000 + "end\n" + "b" * 1000 + "oops"
+
+
+@pytest.mark.skipif(sys.version_info[0] < 3, reason="asyncio requires python3")
+def test_arun(temp_folder):
+    import asyncio
+
+    from runez.program_async import arun
+
+    loop = asyncio.new_event_loop()
+    try:
+        with runez.CaptureOutput(dryrun=True) as logged:
+            assert "Would run: /dev/null" in loop.run_until_complete(arun("/dev/null"))
+            assert "Would run: /dev/null" in logged.pop()
+
+        with runez.CaptureOutput() as logged:
+            assert loop.run_until_complete(arun("/dev/null", fatal=False)) is False
+            assert "/dev/null is not installed" in logged.pop()
+
+            assert runez.touch("sample") == 1
+            assert loop.run_until_complete(arun("ls", ".")) == "sample"
+            assert "Running: %s ." % runez.which("ls") in logged.pop()
+
+            assert loop.run_until_complete(arun("ls", "some-file", fatal=False)) is False
+            assert "exited with code" in logged
+            assert "No such file" in logged.pop()
+
+            r = loop.run_until_complete(arun("ls", "sample", "some-file", include_error=True, fatal=None))
+            assert r.startswith("sample\n")
+            assert "No such file" in r
+
+            with pytest.raises(runez.system.AbortException):
+                loop.run_until_complete(arun("ls", "some-file"))
+
+            # Cancellation kills the child
+            started = time.time()
+            with pytest.raises(asyncio.TimeoutError):
+                loop.run_until_complete(asyncio.wait_for(arun("sleep", "10"), 0.2))
+
+            assert time.time() - started < 5
+
+        with patch("asyncio.create_subprocess_exec", side_effect=Exception("testing")):
+            assert loop.run_until_complete(arun("ls", fatal=False)) is False
+
+    finally:
+        loop.close()
+
+
+def test_path_index(temp_folder):
+    index = runez.program.PathIndex()
+    assert str(index) == "0 folders"
+    assert index.which("ls") == runez.which("ls")
+    assert index.which("some-program") is None
+
+    runez.ensure_folder("bin", folder=True)
+    bin_folder = runez.resolved_path("bin")
+    with patch.dict(os.environ, {"PATH": ":%s:/dev/null" % bin_folder}):
+        assert index.which("foo") is None
+        assert str(index) == "3 folders"
+
+        # Executables in current working dir are seen right away (empty PATH entry), but not cached
+        assert runez.write("foo", "#!/bin/sh\n") == 1
+        assert runez.make_executable("foo") == 1
+        assert index.which("foo") == "foo"
+        assert runez.delete("foo") == 1
+
+        # Newly installed programs are seen right away (folder's mtime changes)
+        assert runez.write("bin/foo", "#!/bin/sh\n") == 1
+        assert index.which("foo") is None
+        assert runez.make_executable("bin/foo") == 1
+        assert index.which("foo") == os.path.join(bin_folder, "foo")
+        assert runez.run("foo") == ""  # "install, then run" works without an explicit refresh()
+
+        assert runez.delete("bin/foo") == 1
+        assert index.which("foo") is None
+
+        with patch("sys.prefix", bin_folder):
+            assert runez.write("bin/bar", "#!/bin/sh\n") == 1
+            assert runez.make_executable("bin/bar") == 1
+            assert index.which("bar") == os.path.join(bin_folder, "bar")
+            assert index.which("bar", ignore_own_venv=True) is None
+
+    # Relative PATH entries are not cached either, they depend on current working dir
+    assert runez.write("a/bin/foo", "#!/bin/sh\n") == 1
+    assert runez.make_executable("a/bin/foo") == 1
+    runez.ensure_folder("b/bin", folder=True)
+    with patch.dict(os.environ, {"PATH": "bin"}):
+        with runez.CurrentFolder("a"):
+            assert index.which("foo") == os.path.join("bin", "foo")
+
+        with runez.CurrentFolder("b"):
+            assert index.which("foo") is None
+
+
+def test_timeout(temp_folder):
+    with runez.CaptureOutput() as logged:
+        usage = runez.RunUsage()
+        assert runez.run(sys.executable, "-c", "print('hello')", usage=usage) == "hello"
+        assert usage.wall_time > 0
+        assert usage.user_time > 0
+        assert usage.max_rss > 1024 * 1024
+        assert "Ran %s: exit code 0, %s" % (runez.short(sys.executable), usage) in logged.pop()
+        assert str(runez.RunUsage(wall_time=1)) == "1.000s wall"
+
+        # Program, and any process it started, are killed on timeout
+        script = "import subprocess; subprocess.Popen(['sleep', '30']); print('started')"
+        started = time.time()
+        assert runez.run(sys.executable, "-c", script, timeout=0.5, fatal=False) is False
+        assert "timed out after 0.5s" in logged.pop()
+
+        assert list(runez.iter_run(sys.executable, "-c", script, timeout=0.5, fatal=False)) == ["started"]
+        assert "timed out after 0.5s" in logged.pop()
+
+        # Timeout can also be reached while waiting for program to exit (after it closed its output)
+        assert runez.run("sh", "-c", "exec >&- 2>&-; sleep 30", timeout=0.5, fatal=False) is False
+        assert "timed out after 0.5s" in logged.pop()
+        assert time.time() - started < 10
+
+        assert runez.run("sh", "-c", "kill -9 $$", fatal=False) is False
+        assert "exited with code -9" in logged.pop()
+        assert runez.run("sleep", "0", timeout=5) == ""
+
+
+def test_many_fds():
+    resource = pytest.importorskip("resource")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < 1200 <= hard or hard == resource.RLIM_INFINITY:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (1200, hard))
+
+    fds = []
+    try:
+        # select() can't handle fds >= 1024, output must still be captured fine with this many files open
+        while not fds or fds[-1] < 1100:
+            fds.append(os.open(os.devnull, os.O_RDONLY))
+
+        assert runez.run("echo", "hello") == "hello"
+        assert runez.run("echo", "hello", timeout=5, capture_limit=100) == "hello"
+        assert list(runez.iter_run("echo", "hello")) == ["hello"]
+
+    except OSError:  # pragma: no cover, can't open that many files here
+        pytest.skip("Can't open enough files")
+
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+def test_run_result(temp_folder):
+    with runez.CaptureOutput(dryrun=True) as logged:
+        r = runez.run("echo", "hello", as_result=True)
+        assert r.succeeded
+        assert r.output == "Would run: %s hello" % runez.which("echo")
+        assert r.error is None
+        assert "Would run:" in logged.pop()
+
+    with runez.CaptureOutput() as logged:
+        script = "import sys; sys.stdout.buffer.write(bytes(range(256))); sys.stderr.write(' oops \\n')"
+        r = runez.run(sys.executable, "-c", script, as_result=True)
+        assert r.succeeded
+        assert r.full_path == runez.which(sys.executable)
+        assert r.stdout == bytes(bytearray(range(256)))
+        assert r.stderr == b" oops \n"
+        assert r.error == "oops"
+        assert r.usage.wall_time > 0
+        with pytest.raises(UnicodeDecodeError):
+            assert r.output
+
+        r = runez.run("ls", "some-file", as_result=True, fatal=False)
+        assert repr(r) == "%s some-file: exit code %s" % (runez.which("ls"), r.exit_code)
+        assert not r.succeeded
+        assert r.output == ""
+        assert "No such file" in r.error
+        assert "exited with code" in logged.pop()
+
+        r = runez.run("echo", "hello", stdout=None, as_result=True, fatal=None)
+        assert r.succeeded
+        assert r.stdout is None
+        assert str(r) == ""
+
+        r = runez.run("/dev/null", as_result=True, fatal=False)
+        assert r.exit_code is None
+        assert "/dev/null is not installed" in logged.pop()
+
+        r = runez.run("echo", "hello", as_result=True, capture_limit=2)
+        assert str(r) == "he\n... [2 bytes omitted] ...\no"
+
+
+def test_pipeline(temp_folder):
+    with runez.CaptureOutput(dryrun=True) as logged:
+        assert runez.run_pipeline(["echo", "a b"], ["wc", "-c"]) == 'Would run: %s "a b" | %s -c' % (runez.which("echo"), runez.which("wc"))
+        assert "Would run:" in logged.pop()
+
+        r = runez.run_pipeline(["echo", "a b"], ["wc", "-c"], as_result=True)
+        assert [x.exit_code for x in r] == [0, 0]
+        assert r[-1].output.startswith("Would run:")
+
+    with runez.CaptureOutput() as logged:
+        assert runez.run_pipeline(["yes"], ["head", "-3"], ["wc", "-l"]) == "3"
+        assert "Ran yes: exit code -13" in logged
+        assert "Ran wc: exit code 0" in logged.pop()
+
+        r = runez.run_pipeline(["echo", "hello"], ["tr", "a-z", "A-Z"], as_result=True)
+        assert [x.succeeded for x in r] == [True, True]
+        assert r[0].stdout is None
+        assert r[1].output == "HELLO"
+        assert r[1].usage.wall_time > 0
+
+        assert runez.run_pipeline(["ls", "some-file"], ["cat"], fatal=False) is False
+        assert "ls exited with code" in logged
+        assert "No such file" in logged.pop()
+
+        r = runez.run_pipeline(["echo", "hello"], ["sh", "-c", "cat >/dev/null; exit 3"], as_result=True, fatal=False)
+        assert [x.exit_code for x in r] == [0, 3]
+
+        output = runez.run_pipeline(["ls", "some-file"], ["cat"], include_error=True, fatal=None)
+        assert "No such file" in output
+
+        assert runez.run_pipeline(["echo", "hello"], ["/dev/null"], fatal=False) is False
+        assert "/dev/null is not installed" in logged.pop()
+
+        assert runez.run_pipeline(["sleep", "30"], ["cat"], timeout=0.2, fatal=False) is False
+        assert "sleep timed out after 0.2s" in logged.pop()
+
+        with patch("subprocess.Popen", side_effect=Exception("testing")):
+            assert runez.run_pipeline(["echo", "hello"], ["cat"], fatal=False) is False
+            assert "echo failed: testing" in logged.pop()
+
+
+def test_redirect(temp_folder):
+    with runez.CaptureOutput(dryrun=True) as logged:
+        expected = "Would run: %s some-file > out/ls.txt 2> out/err.txt" % runez.which("ls")
+        assert runez.run("ls", "some-file", stdout="out/ls.txt", stderr="out/err.txt") == expected
+        assert "Would run:" in logged.pop()
+        assert not os.path.exists("out")
+
+    with runez.CaptureOutput() as logged:
+        assert runez.run("echo", "hello", stdout="out/echo.txt") is None
+        assert "> out/echo.txt" in logged
+        assert "Wrote 6 bytes to out/echo.txt" in logged.pop()
+        assert runez.first_line("out/echo.txt") == "hello"
+
+        assert runez.run("ls", "out", "some-file", stdout="out/ls.txt", stderr="out/ls.txt", fatal=False) is False
+        assert "exited with code" in logged.pop()
+        lines = runez.get_lines("out/ls.txt")
+        assert "echo.txt\n" in lines
+        assert any("No such file" in line for line in lines)
+
+        assert runez.run("echo", "hello", stdout="/dev/null/foo", fatal=False) is False
+        assert "Can't write to /dev/null/foo" in logged.pop()
+
+        r = runez.run_pipeline(["echo", "hello"], ["tr", "a-z", "A-Z"], stdout="out/upper.txt", as_result=True)
+        assert r[-1].stdout is None
+        assert "Wrote 6 bytes to out/upper.txt" in logged.pop()
+        assert runez.first_line("out/upper.txt") == "HELLO"
+
+        assert runez.run_pipeline(["echo", "hello"], ["cat"], stderr="/dev/null/foo", fatal=False) is False
+        assert "Can't write to /dev/null/foo" in logged.pop()
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_spawn"), reason="os.posix_spawn() not available")
+def test_spawn(temp_folder):
+    with runez.CaptureOutput() as logged:
+        assert runez.run("echo", "hello", spawn=True) == "hello"
+        assert runez.run("sh", "-c", "echo $FOO; echo oops >&2", spawn=True, env={"FOO": "foo"}, stderr=-2) == "foo\noops"
+        assert runez.run("cat", spawn=True, stdin=-3) == ""
+        assert runez.run("echo", "hello", spawn=True, stdout="out.txt") is None
+        assert runez.first_line("out.txt") == "hello"
+
+        # SIGPIPE gets its default handler back in spawned programs
+        assert runez.run_pipeline(["yes"], ["head", "-2"], spawn=True) == "y\ny"
+        assert "Ran yes: exit code -13" in logged.pop()
+
+        assert runez.run("ls", "some-file", spawn=True, fatal=False) is False
+        assert "No such file" in logged.pop()
+
+        assert runez.run("sleep", "30", spawn=True, timeout=0.2, fatal=False) is False
+        assert "timed out" in logged.pop()
+
+        # Features not supported by posix_spawn() transparently fall back to Popen
+        assert runez.run("pwd", spawn=True, cwd="/") == "/"
+
+        p = runez.program._SpawnedProcess(["/bin/sh", "-c", "sleep 30"])
+        assert p.poll() is None
+        p.kill()
+        assert p.wait() == -9
+        assert p.poll() == -9
+
+        with patch("os.posix_spawn", side_effect=OSError("testing")):
+            assert runez.run("echo", "hello", spawn=True, fatal=False) is False
+            assert "echo failed: testing" in logged.pop()
+
+
+def test_retry(temp_folder):
+    flaky = "import os, sys; n = len(os.listdir('t')); open('t/%s' % n, 'w').close(); sys.stderr.write('try %s' % n); sys.exit(n < 2)"
+    runez.ensure_folder("t", folder=True)
+    with runez.CaptureOutput() as logged:
+        policy = runez.RetryPolicy(base_delay=0.01)
+        assert str(policy) == "3 attempts"
+        assert runez.run(sys.executable, "-c", flaky, retry=policy, include_error=True, stdout="out.txt") == "try 2"
+        assert "exited with code 1 (attempt 1/3), retrying in " in logged
+        assert "(attempt 2/3)" in logged
+        assert "ERROR" not in logged.pop()
+
+        assert runez.delete("t") == 1
+        assert runez.ensure_folder("t", folder=True) == 1
+        assert runez.run(sys.executable, "-c", flaky, retry=2, fatal=False) is False
+        assert "(attempt 1/2)" in logged
+        assert "exited with code 1: try 1" in logged.pop()
+
+        # Retry only on specified exit codes / stderr patterns
+        policy = runez.RetryPolicy(exit_codes=[2], patterns=["timed? out"], base_delay=0.01)
+        assert runez.run("ls", "some-file", retry=policy, fatal=False) is False
+        assert "(attempt 2/3)" in logged.pop()
+
+        assert runez.run("sh", "-c", "echo timed out >&2; exit 1", retry=policy, fatal=False) is False
+        assert "(attempt 2/3)" in logged.pop()
+
+        assert runez.run("sh", "-c", "echo oops >&2; exit 1", retry=policy, fatal=False) is False
+        assert "attempt" not in logged.pop()
+
+        # No new attempt is made past deadline
+        policy = runez.RetryPolicy(max_attempts=10, base_delay=10, max_delay=10, deadline=0.5)
+        with patch("random.uniform", return_value=1):
+            assert runez.run("ls", "some-file", retry=policy, fatal=False) is False
+            assert "attempt" not in logged.pop()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_child_limits(logged):
+    cpu = min(os.sched_getaffinity(0))
+    script = "nice; ulimit -n; ulimit -t; ulimit -v; grep Cpus_allowed_list /proc/self/status"
+    output = runez.run("sh", "-c", script, nice=5, cpus=[cpu], limits={"nofile": 100, "cpu": 7, "as": "1g"})
+    assert output.splitlines() == ["5", "100", "7", "1048576", "Cpus_allowed_list:\t%s" % cpu]
+
+    output = runez.run("sh", "-c", "nice", nice=2, timeout=5, ionice=("best-effort", 7))
+    assert output == "2"
+
+    assert runez.run("ls", cpus=[], fatal=False) is False
+    assert "Invalid cpus []" in logged.pop()
+
+    assert runez.run("ls", cpus=[100000], fatal=False) is False
+    assert "Invalid cpus [100000]" in logged.pop()
+
+    assert runez.run("ls", limits={"foo": 1}, fatal=False) is False
+    assert "Unknown limit 'foo', supported: as, cpu, nofile" in logged.pop()
+
+    assert runez.run("ls", limits={"nofile": -1}, fatal=False) is False
+    assert "Invalid limit nofile=-1" in logged.pop()
+
+    assert runez.run("ls", ionice="foo", fatal=False) is False
+    assert "Invalid ionice foo" in logged.pop()
+
+    assert runez.run("ls", ionice=("idle", 8), fatal=False) is False
+    assert "Invalid ionice ('idle', 8)" in logged.pop()
+
+
+def test_input(temp_folder, logged):
+    # Large input, fed while output is read (no deadlock)
+    chunk = b"0123456789abcdef" * 4096
+    assert runez.run("wc", "-c", input=(chunk for _ in range(256))).strip() == str(len(chunk) * 256)
+    assert runez.run("cat", input=chunk * 64, capture_limit="1k", spill=False).endswith("cdef")
+    assert runez.run("cat", input=["foo\n", b"bar"]) == "foo\nbar"
+
+    # Program not consuming all its input
+    assert runez.run("head", "-c", "3", input=(chunk for _ in range(1024))) == "012"
+    assert runez.run("true", input=chunk * 64) == ""
+
+    # Text is data, files are passed as-is to program via 'stdin'
+    assert runez.run("cat", input="hello") == "hello"
+    runez.write("sample.txt", "hello\nworld\n")
+    assert runez.run("wc", "-l", stdin="sample.txt") == "2"
+    assert "Running: %s -l < sample.txt" % runez.which("wc") in logged.pop()
+
+    assert runez.run("cat", stdin="no-such-file", fatal=False) is False
+    assert "Can't read no-such-file" in logged.pop()
+
+    # Failing to produce input is reported, program gets EOF (instead of waiting for more input forever)
+    def failing():
+        yield b"hello"
+        raise Exception("oops")
+
+    assert runez.run("cat", input=failing(), fatal=False) is False
+    assert "cat failed: oops" in logged.pop()
+    assert list(runez.iter_run("cat", input=failing(), fatal=False)) == ["hello"]
+    assert "cat failed: oops" in logged.pop()
+    assert runez.run_pipeline(["cat"], ["cat"], input=failing(), fatal=False) is False
+    assert "cat failed: oops" in logged.pop()
+
+    assert list(runez.program.iter_run("cat", input=b"a\nb\n")) == ["a", "b"]
+    assert runez.run_pipeline(["cat"], ["tr", "a", "b"], input=b"aaa") == "bbb"
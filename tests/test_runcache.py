@@ -0,0 +1,57 @@
+import os
+import sys
+
+from mock import patch
+
+import runez
+
+
+def test_run_cache(temp_folder):
+    cache = runez.RunCache(folder="cache", ttl=60, max_size=1000)
+    assert str(cache) == "cache"
+    script = "import sys, time; print(time.time()); sys.stderr.write('oops')"
+    with runez.CaptureOutput() as logged:
+        first = runez.run(sys.executable, "-c", script, cache=cache)
+        assert "Running:" in logged.pop()
+        assert runez.run(sys.executable, "-c", script, cache=cache) == first
+        assert "Reusing cached output of:" in logged.pop()
+
+        r = runez.run(sys.executable, "-c", script, cache=cache, as_result=True)
+        assert r.output == first
+        assert r.error == "oops"
+        assert runez.run(sys.executable, "-c", script, cache=cache, include_error=True) == "%s\noops" % first
+        logged.clear()
+
+        # Args, env and custom stdout are taken into account
+        assert runez.run(sys.executable, "-c", script, "foo", cache=cache) != first
+        assert runez.run(sys.executable, "-c", script, cache=cache, env={"FOO": "1"}) != first
+        assert runez.run(sys.executable, "-c", script, cache=cache, stderr=None) != first
+        assert "Reusing" not in logged.pop()
+
+        # Failed runs are not cached
+        assert runez.run("ls", "some-file", cache=cache, fatal=False) is False
+        assert runez.run("ls", "some-file", cache=cache, fatal=False) is False
+        assert "Reusing" not in logged.pop()
+
+        # Oldest entries are evicted past 'max_size'
+        assert len(os.listdir("cache")) == 3
+        runez.run("echo", "a" * 650, cache=cache)
+        assert len(os.listdir("cache")) == 1
+
+        with runez.CaptureOutput(dryrun=True):
+            assert runez.run("echo", "a" * 200, cache=cache).startswith("Would run:")
+
+        # Expired entries are ignored
+        cache.ttl = 0
+        runez.run("echo", "a" * 200, cache=cache)
+        assert "Reusing" not in logged.pop()
+
+        with patch("os.rename", side_effect=OSError("testing")):
+            runez.run("echo", "hello", cache=cache)
+            assert "Can't save cache entry" in logged.pop()
+
+        assert cache.key("/dev/null/foo", [], {}) is None
+        cache.clear()
+        assert not os.path.exists("cache")
+
+    assert runez.RunCache.default() is runez.RunCache.default()
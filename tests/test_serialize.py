@@ -31,7 +31,7 @@ def test_json(temp_folder):
         assert runez.read_json("sample.json", default={}, fatal=False) == {}
         assert not logged
 
-        with patch("runez.serialize.open", side_effect=Exception):
+        with patch("io.open", side_effect=Exception):
             assert runez.save_json(data, "sample.json", fatal=False) == -1
             assert "Couldn't save" in logged.pop()
 